@@ -1,5 +1,176 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_classic.chains import SequentialChain, LLMChain
+import re
+from loguru import logger
+
+
+# Prompt templates keep their fixed instructions first and the variable
+# content last, so every call shares a byte-identical prefix that
+# provider-side prompt caching can reuse.
+REQUIREMENTS_TEMPLATE = """Analyze the business requirements given at the end of this message and provide a detailed breakdown.
+
+Please provide a structured analysis in the following format:
+
+1. Functional Requirements:
+   - Core features and capabilities
+   - User interactions and workflows
+   - System behaviors and responses
+   - Data processing requirements
+
+2. Non-functional Requirements:
+   - Performance criteria
+   - Scalability needs
+   - Security requirements
+   - Reliability standards
+   - Usability requirements
+
+3. Technical Constraints:
+   - System limitations
+   - Integration requirements
+   - Technology stack constraints
+   - Infrastructure requirements
+
+4. Business Objectives:
+   - Primary goals
+   - Success metrics
+   - Business outcomes
+   - Strategic alignment
+
+For each requirement, include:
+- Priority level (High/Medium/Low)
+- Implementation complexity
+- Dependencies
+- Success criteria
+
+Format the output in a clear, hierarchical structure.
+
+Content: {input_text}"""
+
+SPECS_TEMPLATE = """Based on the analyzed requirements given at the end of this message, create comprehensive technical specifications.
+
+Provide detailed specifications in the following format:
+
+1. System Architecture:
+   - Architecture pattern (e.g., microservices, monolithic)
+   - Component breakdown
+   - System interactions
+   - Data flow patterns
+
+2. Data Models:
+   - Core entities
+   - Relationships
+   - Data validation rules
+   - Storage requirements
+
+3. API Specifications:
+   - Endpoints structure
+   - Request/Response formats
+   - Authentication/Authorization
+   - Rate limiting and security
+
+4. Integration Requirements:
+   - External systems
+   - APIs and protocols
+   - Data synchronization
+   - Error handling
+
+5. Performance Requirements:
+   - Response time targets
+   - Throughput requirements
+   - Scalability metrics
+   - Resource utilization
+
+For each specification:
+- Implementation priority
+- Technical complexity
+- Dependencies
+- Validation criteria
+
+Focus on specifics that can be directly implemented by the development team.
+
+Requirements Analysis: {requirements}"""
+
+ARCHITECTURE_TEMPLATE = """Based on the technical specifications given at the end of this message, recommend a detailed system architecture.
+
+Provide a comprehensive architecture recommendation in the following format:
+
+1. Technology Stack:
+   - Frontend technologies
+   - Backend technologies
+   - Database solutions
+   - Infrastructure components
+
+2. System Components:
+   - Core services
+   - Supporting services
+   - External integrations
+   - Development tools
+
+3. Integration Patterns:
+   - Communication protocols
+   - Data exchange formats
+   - Security measures
+   - Monitoring solutions
+
+4. Deployment Model:
+   - Infrastructure requirements
+   - Scaling strategy
+   - High availability setup
+   - Disaster recovery plan
+
+For each architectural decision:
+- Technical justification
+- Implementation considerations
+- Scalability impact
+- Maintenance implications
+
+Focus on practical, implementable solutions that align with modern best practices.
+
+Technical Specifications: {tech_specs}"""
+
+REVISION_TEMPLATE = """The client has sent a revised version of the requirements document. Update one section of the existing project analysis to match it. Only the changes between the previous and revised document are given at the end of this message, not the whole document.
+
+Update the previous section as follows:
+- Add, modify or remove the items affected by the changes
+- Keep every item the changes do not affect exactly as it was
+- Start every item you added or modified with "[UPDATED]"
+- Never put "[UPDATED]" inside a ```json block; it must stay valid JSON with unchanged phase names unless the changes rename a phase
+- Return the complete updated section in the same structure and format as the previous one
+
+Section: {section}
+
+Changes to the requirements document:
+{changes}
+
+Previous section:
+{previous}"""
+
+
+# Sections updated in place from a document diff; the cost estimate is
+# recomputed from the revised plan instead.
+REVISED_SECTIONS = {
+    "requirements": "Requirements Analysis",
+    "tech_specs": "Technical Specifications",
+    "architecture": "System Architecture",
+    "project_plan": "Project Plan",
+}
+
+
+# Marker the revision prompt asks the model to put on changed items,
+# optionally bolded.
+_UPDATED_MARKER = re.compile(r"\**\[UPDATED\]\**[ \t]?")
+
+
+def strip_update_markers(text):
+    """Remove revision markers, e.g. from a previous revision before it is revised again."""
+    return _UPDATED_MARKER.sub("", text) if isinstance(text, str) else text
+
+
+class StageFailedError(Exception):
+    """Raised when a pipeline stage fails, so no later stage builds on its output."""
+
+    def __init__(self, stage, cause):
+        super().__init__(f"Stage '{stage}' failed: {cause}")
+        self.stage = stage
+        self.cause = cause
 
 
 class AIAnalysisPipeline:
@@ -8,250 +179,53 @@ class AIAnalysisPipeline:
         self._setup_chains()
         
     def _setup_chains(self):
-        # Requirements analysis chain with improved structure
-        requirements_template = """Analyze the following business requirements and provide a detailed breakdown.
-        
-        Content: {input_text}
-        
-        Please provide a structured analysis in the following format:
-
-        1. Functional Requirements:
-           - Core features and capabilities
-           - User interactions and workflows
-           - System behaviors and responses
-           - Data processing requirements
-           
-        2. Non-functional Requirements:
-           - Performance criteria
-           - Scalability needs
-           - Security requirements
-           - Reliability standards
-           - Usability requirements
-           
-        3. Technical Constraints:
-           - System limitations
-           - Integration requirements
-           - Technology stack constraints
-           - Infrastructure requirements
-           
-        4. Business Objectives:
-           - Primary goals
-           - Success metrics
-           - Business outcomes
-           - Strategic alignment
-        
-        For each requirement, include:
-        - Priority level (High/Medium/Low)
-        - Implementation complexity
-        - Dependencies
-        - Success criteria
-
-        Format the output in a clear, hierarchical structure."""
-        
-        self.requirements_chain = LLMChain(
-            llm=self.groq_client.llm,
-            prompt=PromptTemplate.from_template(requirements_template),
-            output_key="requirements"
-        )
-        
-        # Technical specs chain with detailed structure
-        specs_template = """Based on these analyzed requirements, create comprehensive technical specifications.
-
-        Requirements Analysis: {requirements}
-        
-        Provide detailed specifications in the following format:
-
-        1. System Architecture:
-           - Architecture pattern (e.g., microservices, monolithic)
-           - Component breakdown
-           - System interactions
-           - Data flow patterns
-           
-        2. Data Models:
-           - Core entities
-           - Relationships
-           - Data validation rules
-           - Storage requirements
-           
-        3. API Specifications:
-           - Endpoints structure
-           - Request/Response formats
-           - Authentication/Authorization
-           - Rate limiting and security
-           
-        4. Integration Requirements:
-           - External systems
-           - APIs and protocols
-           - Data synchronization
-           - Error handling
-           
-        5. Performance Requirements:
-           - Response time targets
-           - Throughput requirements
-           - Scalability metrics
-           - Resource utilization
-           
-        For each specification:
-        - Implementation priority
-        - Technical complexity
-        - Dependencies
-        - Validation criteria
-
-        Focus on specifics that can be directly implemented by the development team."""
-        
-        self.specs_chain = LLMChain(
-            llm=self.groq_client.llm,
-            prompt=PromptTemplate.from_template(specs_template),
-            output_key="tech_specs"
+        # Chains come precompiled from the process-wide registry, so building
+        # a pipeline per session costs nothing after the first one.
+        self.requirements_chain = self.groq_client.create_chain(
+            REQUIREMENTS_TEMPLATE, stage="requirements", output_key="requirements"
         )
-        
-        # Architecture chain with implementation focus
-        architecture_template = """Based on the technical specifications, recommend a detailed system architecture.
-
-        Technical Specifications: {tech_specs}
-        
-        Provide a comprehensive architecture recommendation in the following format:
-
-        1. Technology Stack:
-           - Frontend technologies
-           - Backend technologies
-           - Database solutions
-           - Infrastructure components
-           
-        2. System Components:
-           - Core services
-           - Supporting services
-           - External integrations
-           - Development tools
-           
-        3. Integration Patterns:
-           - Communication protocols
-           - Data exchange formats
-           - Security measures
-           - Monitoring solutions
-           
-        4. Deployment Model:
-           - Infrastructure requirements
-           - Scaling strategy
-           - High availability setup
-           - Disaster recovery plan
-           
-        For each architectural decision:
-        - Technical justification
-        - Implementation considerations
-        - Scalability impact
-        - Maintenance implications
-
-        Focus on practical, implementable solutions that align with modern best practices."""
-        
-        self.architecture_chain = LLMChain(
-            llm=self.groq_client.llm,
-            prompt=PromptTemplate.from_template(architecture_template),
-            output_key="architecture"
+        self.specs_chain = self.groq_client.create_chain(
+            SPECS_TEMPLATE, stage="tech_specs", output_key="tech_specs"
         )
-
-        # Combined sequential chain
-        self.full_analysis_chain = SequentialChain(
-            chains=[self.requirements_chain, self.specs_chain, self.architecture_chain],
-            input_variables=["input_text"],
-            output_variables=["requirements", "tech_specs", "architecture"],
-            verbose=True
+        self.architecture_chain = self.groq_client.create_chain(
+            ARCHITECTURE_TEMPLATE, stage="architecture", output_key="architecture"
         )
+        self.revision_chains = {
+            stage: self.groq_client.create_chain(REVISION_TEMPLATE, stage=stage, output_key=stage)
+            for stage in REVISED_SECTIONS
+        }
         
     def analyze_requirements(self, content):
         """Analyze and structure the requirements from the input content."""
         try:
-            return self.requirements_chain.run({"input_text": content})
+            return self.groq_client.run_chain(self.requirements_chain, "requirements", input_text=content)
         except Exception as e:
             logger.error(f"Error analyzing requirements: {str(e)}")
-            # Return a structured error message that won't break the chain
-            return """
-            Error analyzing requirements. Using default structure:
-            
-            1. Functional Requirements:
-               - Core system functionality required
-               - Basic user interactions
-               
-            2. Non-functional Requirements:
-               - Standard performance metrics
-               - Basic security requirements
-               
-            3. Technical Constraints:
-               - Standard system limitations
-               - Basic integration needs
-               
-            4. Business Objectives:
-               - Primary system goals
-               - Basic success metrics
-            """
+            raise StageFailedError("requirements", e) from e
     
     def generate_technical_specs(self, requirements):
         """Generate technical specifications based on the requirements."""
         try:
-            return self.specs_chain.run(requirements=requirements)
+            return self.groq_client.run_chain(self.specs_chain, "tech_specs", requirements=requirements)
         except Exception as e:
             logger.error(f"Error generating technical specs: {str(e)}")
-            # Return a structured error message that won't break the chain
-            return """
-            Error generating specifications. Using default structure:
-            
-            1. System Architecture:
-               - Basic system components
-               - Standard interactions
-               
-            2. Data Models:
-               - Core data entities
-               - Basic relationships
-               
-            3. API Specifications:
-               - Essential endpoints
-               - Standard security
-               
-            4. Integration Requirements:
-               - Basic external systems
-               - Standard protocols
-               
-            5. Performance Requirements:
-               - Baseline metrics
-               - Standard scalability
-            """
+            raise StageFailedError("tech_specs", e) from e
         
     def suggest_architecture(self, tech_specs):
         """Suggest system architecture based on technical specifications."""
         try:
-            return self.architecture_chain.run(tech_specs=tech_specs)
+            return self.groq_client.run_chain(self.architecture_chain, "architecture", tech_specs=tech_specs)
         except Exception as e:
             logger.error(f"Error suggesting architecture: {str(e)}")
-            # Return a structured error message that won't break the chain
-            return """
-            Error suggesting architecture. Using default structure:
-            
-            1. Technology Stack:
-               - Standard web technologies
-               - Basic database solution
-               
-            2. System Components:
-               - Core service components
-               - Essential integrations
-               
-            3. Integration Patterns:
-               - REST APIs
-               - Standard security
-               
-            4. Deployment Model:
-               - Basic cloud infrastructure
-               - Standard scaling approach
-            """
+            raise StageFailedError("architecture", e) from e
         
-    def run_full_analysis(self, content):
-        """Run the complete analysis pipeline with error handling."""
+    def revise_section(self, stage, previous, changes):
+        """Update a previously generated section with the changes between document versions."""
         try:
-            return self.full_analysis_chain({"input_text": content})
+            return self.groq_client.run_chain(
+                self.revision_chains[stage], stage,
+                section=REVISED_SECTIONS[stage], changes=changes, previous=previous
+            )
         except Exception as e:
-            logger.error(f"Error in full analysis: {str(e)}")
-            # Return a structured response with all required keys
-            return {
-                "requirements": self.analyze_requirements(content),
-                "tech_specs": self.generate_technical_specs("Basic requirements"),
-                "architecture": self.suggest_architecture("Standard specifications")
-            }
\ No newline at end of file
+            logger.error(f"Error revising {stage}: {str(e)}")
+            raise StageFailedError(stage, e) from e
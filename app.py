@@ -1,13 +1,45 @@
 import streamlit as st
 from document_processor import DocumentProcessor
-from ai_analysis import AIAnalysisPipeline
+from ai_analysis import AIAnalysisPipeline, StageFailedError, strip_update_markers
 from project_planner import ProjectPlanner
 from cost_estimator import CostEstimator
 from document_generator import DocumentGenerator
 from groq_client import GroqClient
+from pipeline_runner import AnalysisRunner, STAGES
+from checkpoint_store import fingerprint
+from history_store import get_history_store
+from speculation import SpeculativeAnalysis, speculation_enabled
+from llm_scheduler import INTERACTIVE, BATCH, Tenant, get_llm_scheduler, set_tenant
+from revision import DocumentDiff, MAX_CHANGED_RATIO, changes_markdown
+from schedule_engine import ScheduleError, as_number, build_schedule, extract_phases, strip_phases_block
+from datetime import datetime
+import uuid
+from metrics import metrics
+from llm_transport import transport_stats
+from settings import get_config
 from loguru import logger
 
-def format_project_plan_markdown(project_plan):
+def format_schedule_markdown(schedule, max_critical=30):
+    md = f"\n**Duration:** {schedule['duration_days']:.1f} working days along the critical path, "
+    md += f"{schedule['leveled_duration_days']:.1f} days with the configured team capacity\n\n"
+    md += "| Phase | Start (day) | Finish (day) | Slack (days) | Levelled Start | Levelled Finish |\n"
+    md += "|-------|-------------|--------------|--------------|----------------|-----------------|\n"
+    for phase in schedule["phases"]:
+        name = f"🔴 **{phase['name']}**" if phase["critical"] else phase["name"]
+        md += (f"| {name} | {phase['earliest_start']:.1f} | {phase['earliest_finish']:.1f} | {phase['slack']:.1f} "
+               f"| {phase['leveled_start']:.1f} | {phase['leveled_finish']:.1f} |\n")
+    
+    md += "\n### Critical Path\n"
+    for step, activity in enumerate(schedule["critical_path"][:max_critical], 1):
+        md += f"{step}. {activity}\n"
+    if len(schedule["critical_path"]) > max_critical:
+        md += f"\n... and {len(schedule['critical_path']) - max_critical} more activities\n"
+    
+    for warning in schedule["warnings"]:
+        md += f"\n⚠️ {warning}"
+    return md + "\n"
+
+def format_project_plan_markdown(project_plan, schedule=None):
     md = """
 # 📅 Project Plan Details
 
@@ -21,39 +53,48 @@ def format_project_plan_markdown(project_plan):
             md += "| Phase | Hours | Complexity | Main Roles |\n"
             md += "|-------|--------|------------|------------|\n"
             
-            total_hours = 0
-            for phase in wb["phases"]:
-                hours = phase.get("estimated_hours", 0)
+            # Model output may give numbers as strings, null or "60%";
+            # normalise them so the plan still renders.
+            phases = [phase for phase in wb["phases"] if isinstance(phase, dict)]
+            total_hours = 0.0
+            for phase in phases:
+                hours = as_number(phase.get("estimated_hours"))
                 total_hours += hours
                 complexity = phase.get("complexity_factor", 1.0)
                 
                 # Get top 2 roles by distribution
-                roles = phase.get("role_distribution", {})
-                top_roles = sorted(roles.items(), key=lambda x: x[1], reverse=True)[:2]
-                role_text = ", ".join([role for role, _ in top_roles])
+                roles = phase.get("role_distribution") or {}
+                top_roles = sorted(roles.items(), key=lambda x: as_number(x[1]), reverse=True)[:2]
+                role_text = ", ".join([str(role) for role, _ in top_roles])
                 
-                md += f"| {phase['name']} | {hours} | {complexity}x | {role_text} |\n"
+                md += f"| {phase.get('name', '')} | {hours:g} | {complexity}x | {role_text} |\n"
             
-            md += f"\n**Total Estimated Hours:** {total_hours}\n\n"
+            md += f"\n**Total Estimated Hours:** {total_hours:g}\n\n"
             
             # Detailed phase breakdown
             md += "\n### Detailed Phase Breakdown\n"
-            for phase in wb["phases"]:
-                md += f"\n#### {phase['name']}\n"
-                md += f"**Hours:** {phase.get('estimated_hours', 0)}  "
+            for phase in phases:
+                md += f"\n#### {phase.get('name', '')}\n"
+                md += f"**Hours:** {as_number(phase.get('estimated_hours')):g}  "
                 md += f"**Complexity:** {phase.get('complexity_factor', 1.0)}x\n\n"
                 
-                # Role distribution
+                # Role distribution, as shares of the phase whether the
+                # model gave fractions or percentages
                 md += "**Team Allocation:**\n"
-                for role, percentage in phase.get("role_distribution", {}).items():
-                    md += f"- {role}: {percentage * 100:.0f}%\n"
+                shares = {role: as_number(share) for role, share in (phase.get("role_distribution") or {}).items()}
+                total_share = sum(shares.values())
+                for role, share in shares.items():
+                    md += f"- {role}: {share / total_share if total_share else 0:.0%}\n"
                 md += "\n"
                 
                 # Tasks
                 if "tasks" in phase and phase["tasks"]:
                     md += "**Tasks:**\n"
                     for task in phase["tasks"]:
-                        md += f"- {task}\n"
+                        if isinstance(task, dict):
+                            md += f"- {task.get('name', '')} ({task.get('estimated_hours', 0)}h, {task.get('role', 'unassigned')})\n"
+                        else:
+                            md += f"- {task}\n"
                 md += "\n"
                 
                 # Deliverables
@@ -72,8 +113,11 @@ def format_project_plan_markdown(project_plan):
         else:
             md += str(wb)
     
-    md += "\n## ⏱️ Timeline\n"
-    if "timeline" in project_plan:
+    if schedule:
+        md += "\n## ⏱️ Timeline\n"
+        md += format_schedule_markdown(schedule)
+    elif "timeline" in project_plan:
+        md += "\n## ⏱️ Timeline\n"
         timeline_text = project_plan['timeline']
         # Split timeline into phases
         phases = timeline_text.split('\n\n')
@@ -89,8 +133,8 @@ def format_project_plan_markdown(project_plan):
                         md += f"{line}\n"
         md += "\n"
     
-    md += "\n## 👥 Required Resources\n"
     if "resources" in project_plan:
+        md += "\n## 👥 Required Resources\n"
         resources_text = project_plan['resources']
         sections = resources_text.split('\n\n')
         for section in sections:
@@ -106,8 +150,8 @@ def format_project_plan_markdown(project_plan):
             else:
                 md += section + "\n\n"
     
-    md += "\n## ⚠️ Risk Assessment\n"
     if "risks" in project_plan:
+        md += "\n## ⚠️ Risk Assessment\n"
         risks_text = project_plan['risks']
         # Format risks with severity indicators
         risk_levels = {
@@ -245,31 +289,238 @@ def initialize_groq_client():
         st.error(f"Failed to initialize Groq client: {str(e)}")
         return None
 
-def run_ai_analysis(ai_pipeline, content):
-    progress_bar = st.progress(0)
-    col1, col2, col3 = st.columns(3)
-    
+STAGE_LABELS = {
+    "requirements": "Requirements analysis",
+    "tech_specs": "Technical specifications",
+    "architecture": "Architecture",
+    "project_plan": "Project plan",
+    "cost_estimate": "Cost estimate"
+}
+
+SECTIONS = {
+    "requirements": ("Requirements", "📋 Analyzed Requirements"),
+    "tech_specs": ("Technical Specs", "🔧 Technical Specifications"),
+    "architecture": ("Architecture", "🏗️ Suggested Architecture"),
+    "project_plan": ("Project Plan", "📅 Project Plan"),
+    "cost_estimate": ("Cost Estimate", "💰 Cost Estimate")
+}
+
+def create_result_tabs():
+    """Create one tab per stage, each holding a placeholder filled as the stage finishes."""
+    tabs = st.tabs([SECTIONS[stage][0] for stage in STAGES])
+    placeholders = {}
+    for stage, tab in zip(STAGES, tabs):
+        with tab:
+            placeholders[stage] = st.empty()
+            placeholders[stage].caption(f"⏳ Waiting for {STAGE_LABELS[stage].lower()}...")
+    return placeholders
+
+def plan_schedule(project_plan, team_capacity=None):
+    """Schedule the phases in the plan's JSON block; returns (phases, schedule, error)."""
+    # A revised plan may carry markers in its JSON block despite the prompt.
+    phases = extract_phases(strip_update_markers(project_plan))
+    if not phases:
+        return None, None, None
     try:
-        with col1:
-            with st.spinner("Analyzing requirements..."):
-                requirements = ai_pipeline.analyze_requirements(content)
-                progress_bar.progress(33)
-
-        with col2:
-            with st.spinner("Generating technical specs..."):
-                tech_specs = ai_pipeline.generate_technical_specs(requirements)
-                progress_bar.progress(66)
-
-        with col3:
-            with st.spinner("Suggesting architecture..."):
-                architecture = ai_pipeline.suggest_architecture(tech_specs)
-                progress_bar.progress(100)
-
-        return requirements, tech_specs, architecture
-    except Exception as e:
+        return phases, build_schedule(phases, team_capacity), None
+    except ScheduleError as e:
+        logger.warning(f"Could not schedule project plan: {str(e)}")
+        return phases, None, str(e)
+
+def render_section(placeholder, stage, output, seconds=None, from_checkpoint=False, team_capacity=None):
+    tab_name, header = SECTIONS[stage]
+    export = output
+    with placeholder.container():
+        st.header(header)
+        if from_checkpoint:
+            st.caption("Restored from checkpoint")
+        elif seconds is not None:
+            st.caption(f"Completed in {seconds:.1f}s")
+        # Highlight the items a revision run added or modified
+        shown = output.replace("[UPDATED]", ":orange[**[UPDATED]**]")
+        phases = None
+        if stage == "project_plan":
+            phases, schedule, error = plan_schedule(output, team_capacity)
+        if phases:
+            # Timeline and critical path come from the schedule engine,
+            # not from the model's text
+            details = format_project_plan_markdown({"work_breakdown": {"phases": phases}}, schedule)
+            st.markdown(strip_phases_block(shown))
+            if error:
+                st.warning(f"Could not compute the schedule: {error}")
+            st.markdown(details)
+            export = f"{strip_phases_block(output)}\n\n{details}"
+        elif stage in ("project_plan", "cost_estimate"):
+            st.markdown(shown)
+        else:
+            st.write(shown)
+        st.download_button(
+            f"📥 Export {tab_name} as MD",
+            export,
+            file_name=f"{stage}.md",
+            mime="text/markdown",
+            key=f"export_{stage}",
+            # Sections render while later stages still run; a rerun here
+            # would stop the analysis partway through.
+            on_click="ignore"
+        )
+
+def run_analysis(runner, content, cost_params, run_id, revision=None):
+    """Run the stages, rendering each section and updating progress as it completes.
+
+    revision, if given, is (previous_outputs, diff) and updates a past run
+    from the document changes instead of analyzing from scratch.
+    """
+    progress_bar = st.progress(0, text="Starting analysis...")
+    placeholders = create_result_tabs()
+    timings = {}
+
+    def on_stage_start(stage):
+        placeholders[stage].info(f"⏳ {STAGE_LABELS[stage]} in progress...")
+        progress_bar.progress(
+            int(len(timings) / len(STAGES) * 100),
+            text=f"{STAGE_LABELS[stage]} ({len(timings) + 1}/{len(STAGES)})..."
+        )
+
+    def on_stage_complete(stage, output, seconds, from_checkpoint):
+        timings[stage] = round(seconds, 2)
+        render_section(placeholders[stage], stage, output, seconds, from_checkpoint,
+                       team_capacity=cost_params.get("team_capacity"))
+        progress_bar.progress(
+            int(len(timings) / len(STAGES) * 100),
+            text=f"✔ {STAGE_LABELS[stage]} ({len(timings)}/{len(STAGES)} stages complete)"
+        )
+
+    try:
+        if revision is not None:
+            outputs = runner.run_revision(
+                content, cost_params, *revision, run_id=run_id,
+                on_stage_start=on_stage_start, on_stage_complete=on_stage_complete
+            )
+        else:
+            outputs = runner.run(
+                content, cost_params, run_id=run_id,
+                on_stage_start=on_stage_start, on_stage_complete=on_stage_complete
+            )
+        return outputs, timings
+    except StageFailedError as e:
         logger.error(f"AI analysis failed: {str(e)}")
-        st.error("An error occurred during AI analysis. Please try again.")
-        return None, None, None
+        placeholders[e.stage].error(f"{STAGE_LABELS.get(e.stage, e.stage)} failed.")
+        st.error(f"{STAGE_LABELS.get(e.stage, e.stage)} failed. Completed stages are saved; "
+                 "start the analysis again to resume from this stage.")
+        return None, timings
+
+def show_report_download(final_documents):
+    st.divider()
+    st.subheader("📊 Complete Report")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.download_button(
+            label="📥 Download Complete Report (DOCX)",
+            data=final_documents,
+            file_name="project_analysis_report.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            use_container_width=True,
+            on_click="ignore"
+        )
+
+def upload_fingerprint(uploaded_files):
+    """Fingerprint of the uploads, hashing each file's bytes once per upload.
+
+    Streamlit reruns the script on every widget change; an upload keeps its
+    file_id until it is replaced, so its hash is cached under that ID.
+    """
+    cached = st.session_state.get("upload_hashes", {})
+    hashes = {}
+    for file in uploaded_files:
+        hashes[file.file_id] = cached.get(file.file_id) or fingerprint(file.name, file.getvalue())
+    # Only the current uploads are kept, so removed files don't accumulate.
+    st.session_state["upload_hashes"] = hashes
+    return fingerprint(*hashes.values())
+
+def update_speculation(uploaded_files, document_hash, groq_client, enabled=True):
+    """Start, keep or cancel speculative pre-analysis to match the current uploads."""
+    current = st.session_state.get("speculation")
+    if current is not None and (current.document_hash != document_hash or not enabled):
+        current.cancel()
+        current = None
+        st.session_state.pop("speculation", None)
+    if uploaded_files and current is None and enabled and speculation_enabled():
+        # Only the requirements stage runs speculatively, so the runner needs
+        # no planner or cost estimator.
+        runner = AnalysisRunner(AIAnalysisPipeline(groq_client), None, None)
+        current = SpeculativeAnalysis(
+            document_hash,
+            [(file.name, file.getvalue()) for file in uploaded_files],
+            DocumentProcessor(),
+            runner
+        )
+        st.session_state["speculation"] = current
+    return current
+
+def select_revision_base():
+    """Let the user mark the upload as a revision of a past run; returns its ID or None."""
+    runs = get_history_store().list_runs(limit=50)
+    labels = {None: "New analysis"}
+    labels.update({
+        run["id"]: f"Revision of #{run['id']} · {run['file_name']} · {datetime.fromtimestamp(run['created_at']):%Y-%m-%d %H:%M}"
+        for run in runs
+    })
+    return st.selectbox(
+        "Analysis mode", list(labels), format_func=labels.get, key="revision_base",
+        help="For a new version of a document analyzed before: only the changed text is re-analyzed "
+             "and merged into that run's requirements, specs and plan."
+    )
+
+def show_revision_changes(changes, base_run_id):
+    counts = {kind: sum(change["kind"] == kind for change in changes) for kind in ("added", "changed", "removed")}
+    with st.expander(
+        f"🔁 Changes since run #{base_run_id}: {counts['added']} added, "
+        f"{counts['changed']} changed, {counts['removed']} removed",
+        expanded=True
+    ):
+        if changes:
+            st.markdown(changes_markdown(changes))
+        else:
+            st.caption("The document text is unchanged.")
+
+def display_results(outputs, final_documents, timings=None, team_capacity=None):
+    timings = timings or {}
+    placeholders = create_result_tabs()
+    for stage in STAGES:
+        render_section(placeholders[stage], stage, outputs.get(stage, ""), timings.get(stage),
+                       team_capacity=team_capacity)
+    show_report_download(final_documents)
+
+def show_history_panel():
+    """Sidebar panel for searching and reloading past runs without the LLM."""
+    st.sidebar.subheader("🗂️ Analysis History")
+    with st.sidebar.expander("Search Past Runs", expanded=False):
+        history = get_history_store()
+        query = st.text_input("Search requirements and plans", key="history_query")
+        runs = history.search(query, limit=50) if query.strip() else history.list_runs(limit=50)
+        if not runs:
+            st.caption("No matching runs.")
+            return
+        labels = {
+            run["id"]: f"#{run['id']} · {run['file_name']} · {datetime.fromtimestamp(run['created_at']):%Y-%m-%d %H:%M}"
+            for run in runs
+        }
+        selected = st.selectbox("Past runs", list(labels), format_func=labels.get, key="history_selected")
+        if st.button("📂 Load Run", use_container_width=True):
+            st.session_state["loaded_run_id"] = selected
+
+def display_loaded_run(run_id):
+    run = get_history_store().load_run(run_id)
+    if run is None:
+        st.warning(f"Run #{run_id} is no longer in the history.")
+        st.session_state.pop("loaded_run_id", None)
+        return
+    st.info(f"Showing saved run #{run['id']} for {run['file_name']} "
+            f"from {datetime.fromtimestamp(run['created_at']):%Y-%m-%d %H:%M}")
+    if run["changes"] is not None:
+        show_revision_changes(run["changes"], run["base_run_id"])
+    display_results(run["outputs"], run["docx"], run["timings"], run["cost_params"].get("team_capacity"))
 
 def get_cost_inputs():
     st.sidebar.title("Cost Configuration")
@@ -284,6 +535,13 @@ def get_cost_inputs():
             "Designer": st.number_input("Designer Rate (USD/hr)", min_value=0.0, value=125.0, step=10.0)
         }
         avg_hourly_rate = sum(hourly_rates.values()) / len(hourly_rates)
+        st.caption("Team capacity, used to level the schedule")
+        team_capacity = {
+            "Junior Developer": st.number_input("Junior Developers", min_value=1, value=2, step=1),
+            "Senior Developer": st.number_input("Senior Developers", min_value=1, value=2, step=1),
+            "Project Manager": st.number_input("Project Managers", min_value=1, value=1, step=1),
+            "Designer": st.number_input("Designers", min_value=1, value=1, step=1)
+        }
     
     # Infrastructure Costs Section
     st.sidebar.subheader("🖥️ Infrastructure Costs")
@@ -334,6 +592,7 @@ def get_cost_inputs():
     return {
         "hourly_rate": avg_hourly_rate,
         "hourly_rates": hourly_rates,
+        "team_capacity": team_capacity,
         "infrastructure_cost": infrastructure_cost,
         "license_cost": license_cost,
         "complexity_multiplier": complexity_multiplier,
@@ -342,7 +601,34 @@ def get_cost_inputs():
         "additional_licenses": additional_licenses
     }
 
+def show_llm_metrics():
+    with st.sidebar.expander("📈 LLM Call Metrics", expanded=False):
+        snapshot = metrics.snapshot()
+        if not snapshot["counters"] and not snapshot["timings"]:
+            st.caption("No LLM calls recorded yet.")
+        else:
+            st.json(snapshot)
+            st.caption("Shared HTTP transport")
+            st.json(transport_stats())
+
+def show_scheduler_status():
+    with st.sidebar.expander("🚦 LLM Queue", expanded=False):
+        depth = get_llm_scheduler().queue_depth()
+        st.caption(f"{depth['sessions']} session(s) waiting for the shared request quota")
+        for priority in (INTERACTIVE, BATCH):
+            p95 = metrics.percentile(f"scheduler.{priority}.wait", 95)
+            st.metric(
+                f"{priority.title()} queue",
+                depth[priority],
+                help="Calls waiting now; p95 wait over recent calls is shown below.",
+            )
+            st.caption(f"p95 wait: {p95:.1f}s" if p95 is not None else "p95 wait: no calls yet")
+
 def main():
+    get_config()
+    # Attribute this session's LLM calls to it, so the shared quota is
+    # split fairly between sessions
+    set_tenant(Tenant(st.session_state.setdefault("session_id", uuid.uuid4().hex)))
     st.title("AI Document Generation System")
     
     # Initialize Groq client
@@ -353,12 +639,25 @@ def main():
     
     # Get cost inputs from sidebar
     cost_params = get_cost_inputs()
+    show_history_panel()
+    show_llm_metrics()
+    show_scheduler_status()
     
     # Main content area
     st.subheader("📄 Document Upload")
-    uploaded_file = st.file_uploader("Upload Business Requirements Document", type=['docx', 'pdf', 'txt'])
+    uploaded_files = st.file_uploader(
+        "Upload Business Requirements Documents",
+        type=['docx', 'pdf', 'txt'],
+        accept_multiple_files=True,
+        help="Upload the RFP together with any appendices; they are analyzed as one merged document."
+    )
+    document_hash = upload_fingerprint(uploaded_files) if uploaded_files else None
+    revision_base = select_revision_base() if uploaded_files else None
+    # A revision only re-analyzes the changes, so a speculative full
+    # requirements pass would be wasted work.
+    speculation = update_speculation(uploaded_files, document_hash, groq_client, enabled=revision_base is None)
     
-    if uploaded_file:
+    if uploaded_files:
         # Show start button
         start_process = st.button("🚀 Start Document Analysis", type="primary", use_container_width=True)
         
@@ -369,104 +668,73 @@ def main():
             project_planner = ProjectPlanner(groq_client)
             cost_estimator = CostEstimator(groq_client)  # Updated to use groq_client
             doc_generator = DocumentGenerator()
+            runner = AnalysisRunner(ai_pipeline, project_planner, cost_estimator)
             
             try:
                 # Process document
                 with st.spinner("Processing document..."):
-                    extracted_content = doc_processor.process_document(uploaded_file)
-                    
-                    # Add cost parameters to the content for LLM context
-                    enhanced_content = f"""
-                    Document Content:
-                    {extracted_content}
-                    
-                    Cost Parameters:
-                    - Average Hourly Rate: ${cost_params['hourly_rate']}
-                    - Infrastructure Cost: ${cost_params['infrastructure_cost']}
-                    - License Cost: ${cost_params['license_cost']}
-                    - Complexity Multiplier: {cost_params['complexity_multiplier']}
-                    - Risk Factor: {cost_params['risk_factor']}
-                    - Cloud Services: {', '.join(cost_params['cloud_services'])}
-                    - Additional Licenses: {', '.join(cost_params['additional_licenses'])}
-                    """
-                    
-                    # AI Analysis with cost context
-                    requirements, tech_specs, architecture = run_ai_analysis(ai_pipeline, enhanced_content)
-                    
-                    # Project Planning with cost awareness
-                    project_plan = project_planner.generate_plan(tech_specs)
-                    
-                    # Cost Estimation using direct LLM analysis
-                    cost_estimate = cost_estimator.calculate_costs(project_plan, cost_params)
-                    
-                    # Generate Final Documents
+                    # Pick up extraction and requirements analysis already
+                    # started in the background when the file was uploaded
+                    if speculation is not None:
+                        extracted_content = speculation.result()
+                    else:
+                        extracted_content = doc_processor.process_documents(uploaded_files)
+                
+                # In revision mode, diff against the text stored with the
+                # base run so only the changed segments go to the model
+                base_run, diff, run_id = None, None, document_hash
+                if revision_base is not None:
+                    base_run = get_history_store().load_run(revision_base)
+                    if base_run and base_run["source_text"]:
+                        diff = DocumentDiff(base_run["source_text"], extracted_content)
+                        run_id = fingerprint(document_hash, "revision", base_run["id"])
+                        show_revision_changes(diff.changes, base_run["id"])
+                        if diff.changed_ratio > MAX_CHANGED_RATIO:
+                            st.info(f"{diff.changed_ratio:.0%} of the document changed; running a full analysis.")
+                    else:
+                        st.warning(f"Run #{revision_base} has no stored document text; running a full analysis.")
+                
+                # AI analysis, planning and cost estimation, resuming from
+                # any stages already checkpointed for this document. Cost
+                # parameters only feed the cost stage, so the earlier
+                # stages don't depend on the sidebar settings. Each tab
+                # fills in as soon as its stage finishes.
+                outputs, timings = run_analysis(
+                    runner, extracted_content, cost_params, run_id,
+                    revision=(base_run["outputs"], diff) if diff is not None else None
+                )
+                if outputs is None:
+                    return
+                
+                # Generate Final Documents
+                with st.spinner("Generating report..."):
+                    _, schedule, _ = plan_schedule(outputs["project_plan"], cost_params["team_capacity"])
                     final_documents = doc_generator.generate_documents(
-                        requirements=requirements,
-                        tech_specs=tech_specs,
-                        project_plan=project_plan,
-                        cost_estimate=cost_estimate
+                        revision_changes=diff.changes if diff is not None else None,
+                        requirements=outputs["requirements"],
+                        tech_specs=outputs["tech_specs"],
+                        project_plan=strip_phases_block(outputs["project_plan"]),
+                        schedule=schedule,
+                        cost_estimate=outputs["cost_estimate"]
                     )
-                    
-                    # Display Results
-                    st.success("✅ Document processing complete!")
-                    
-                    # Display tabs for different sections
-                    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Requirements", "Technical Specs", "Architecture", "Project Plan", "Cost Estimate"])
-                    
-                    with tab1:
-                        st.header("📋 Analyzed Requirements")
-                        st.write(requirements)
-                        
-                    with tab2:
-                        st.header("🔧 Technical Specifications")
-                        st.write(tech_specs)
-                        
-                    with tab3:
-                        st.header("🏗️ Suggested Architecture")
-                        st.write(architecture)
-                        
-                    with tab4:
-                        st.header("📅 Project Plan")
-                        st.markdown(project_plan)
-                        
-                        # Add export buttons
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.download_button(
-                                "📥 Export Project Plan as MD",
-                                project_plan,
-                                file_name="project_plan.md",
-                                mime="text/markdown"
-                            )
-                        
-                    with tab5:
-                        st.header("💰 Cost Estimate")
-                        st.markdown(cost_estimate)
-                        
-                        # Add export buttons
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.download_button(
-                                "📥 Export Cost Estimate as MD",
-                                cost_estimate,
-                                file_name="cost_estimate.md",
-                                mime="text/markdown"
-                            )
-                    
-                    # Download complete report
-                    st.divider()
-                    st.subheader("📊 Complete Report")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.download_button(
-                            label="📥 Download Complete Report (DOCX)",
-                            data=final_documents,
-                            file_name="project_analysis_report.docx",
-                            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                            use_container_width=True
-                        )
+                run_id = get_history_store().save_run(
+                    ", ".join(file.name for file in uploaded_files), document_hash, cost_params,
+                    outputs, final_documents, timings,
+                    source_text=extracted_content,
+                    base_run_id=base_run["id"] if diff is not None else None,
+                    changes=diff.changes if diff is not None else None
+                )
+                # Keep showing this run after a download button reruns the script
+                st.session_state["loaded_run_id"] = run_id
+                
+                st.success("✅ Document processing complete!")
+                show_report_download(final_documents)
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
+            return
+
+    if st.session_state.get("loaded_run_id"):
+        display_loaded_run(st.session_state["loaded_run_id"])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
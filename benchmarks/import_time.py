@@ -0,0 +1,71 @@
+"""Cold-start benchmark for the pipeline modules a worker imports.
+
+Each run imports the modules in a fresh interpreter and reports the best
+wall time of several runs. Exits non-zero if that exceeds the threshold or
+if a heavy dependency (LLM SDKs, document parsers, numpy) was loaded at
+import time instead of on first use.
+
+    python benchmarks/import_time.py [--max-seconds 0.5] [--runs 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Everything a worker needs apart from the Streamlit UI in app.py.
+MODULES = [
+    "settings", "document_processor", "groq_client", "ai_analysis", "project_planner",
+    "cost_estimator", "document_generator", "pipeline_runner", "history_store",
+    "speculation", "revision", "schedule_engine", "estimation_index",
+]
+# Loaded on first use only; importing any of them up front is a regression.
+DEFERRED = [
+    "langchain_groq", "langchain_core", "langchain_classic", "groq", "httpx",
+    "dotenv", "PyPDF2", "docx", "numpy",
+]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {deferred!r} if name in sys.modules]}}))
+"""
+
+
+def measure():
+    probe = _PROBE.format(modules=MODULES, deferred=DEFERRED)
+    result = subprocess.run(
+        [sys.executable, "-c", probe], cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-seconds", type=float, default=float(os.getenv("IMPORT_TIME_MAX_SECONDS", "0.5")))
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    samples = [measure() for _ in range(args.runs)]
+    best = min(sample["seconds"] for sample in samples)
+    loaded = sorted({name for sample in samples for name in sample["loaded"]})
+    print(f"Imported {len(MODULES)} modules in {best * 1000:.1f} ms (best of {args.runs}, "
+          f"threshold {args.max_seconds * 1000:.0f} ms)")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: deferred dependencies loaded at import time: {', '.join(loaded)}")
+        failed = True
+    if best > args.max_seconds:
+        print("FAIL: import time is over the threshold")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Peak memory of streaming a large TXT upload through DocumentProcessor.
+
+A generated upload of --size-mb megabytes is fed to _process_txt without
+ever existing in full on disk or in memory, and tracemalloc's peak is
+checked against --max-mb. Three inputs are used: dense prose, where
+reading stops once the token budget is full; sparse text (long runs of
+blank lines) that stays under the budget, so every byte up to
+MAX_INPUT_BYTES is read and decoded; and minified JSON with no whitespace
+at all, i.e. one word as long as the file. The first two include
+multi-byte and invalid UTF-8 split across read blocks. Exits non-zero if
+any peak is over the bound.
+
+    python benchmarks/ingest_memory.py [--size-mb 200] [--max-mb 8]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from document_processor import CHARS_PER_TOKEN, DocumentProcessor  # noqa: E402
+
+DENSE = "The system shall export invoices to the ERP nightly, façade naïve 日本語. ".encode("utf-8")
+SPARSE_WORDS = "naïve 日本語 façade".encode("utf-8") + b"\xff "
+MINIFIED = '{"id":1042,"customer":"Façade-GmbH","items":[{"sku":"A-17","qty":3}]},'.encode("utf-8")
+
+
+def sparse_pattern(size, budget_chars):
+    """A few words padded with blank lines, sparse enough to fit size bytes in the budget."""
+    periods = max(1, int(0.8 * budget_chars) // len(SPARSE_WORDS))
+    return SPARSE_WORDS + b"\n" * max(0, size // periods - len(SPARSE_WORDS))
+
+
+class GeneratedUpload:
+    """File-like upload that repeats a pattern up to size bytes, generated on read."""
+
+    def __init__(self, pattern, size, name):
+        # Long enough that a read never needs more than one slice of it.
+        self._data = pattern * (2 * (1 << 20) // len(pattern) + 2)
+        self._period = len(pattern)
+        self.size = size
+        self.name = name
+        self._offset = 0
+
+    def read(self, n=-1):
+        n = self.size - self._offset if n < 0 else min(n, self.size - self._offset)
+        start = self._offset % self._period
+        self._offset += n
+        return self._data[start:start + n]
+
+
+def measure(pattern, size, label):
+    upload = GeneratedUpload(pattern, size, f"{label}.txt")
+    processor = DocumentProcessor(max_bytes=size)
+    tracemalloc.start()
+    start = time.perf_counter()
+    text = processor._process_txt(upload)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"read_mb": upload._offset / 1e6, "chars": len(text), "peak_mb": peak / 1e6, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=200)
+    parser.add_argument("--max-mb", type=float, default=float(os.getenv("INGEST_MAX_PEAK_MB", "8")))
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1e6)
+    failed = False
+    sparse = sparse_pattern(size, DocumentProcessor().max_tokens * CHARS_PER_TOKEN)
+    for label, pattern in (("dense", DENSE), ("sparse", sparse), ("nospace", MINIFIED)):
+        result = measure(pattern, size, label)
+        print(f"{label:<7} read {result['read_mb']:.1f} MB, kept {result['chars']} chars, "
+              f"peak {result['peak_mb']:.2f} MB in {result['seconds']:.1f}s")
+        if result["peak_mb"] > args.max_mb:
+            print(f"FAIL: {label} peak is over {args.max_mb:.0f} MB")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Per-call logging overhead of each LOG_MODE.
+
+Each mode runs in a fresh interpreter (loguru sinks are process-wide) inside
+a temporary directory, so the log files it writes are thrown away. A call
+does what a completion does on the request path: sample the prompt and
+response payloads and write the debug records, inside the run and stage
+context. "none" has no sinks and is the baseline.
+
+The queued modes (async, json) only put each record on an in-process queue;
+formatting, serialisation and the disk write happen on the writer thread.
+The cost of a call is the CPU time of the calling thread, so the writer's
+work is not counted, and each mode reports its best of --runs processes.
+Exits non-zero if a queued mode costs more per call than the synchronous
+"text" sink (beyond --tolerance, for timing noise) or, with
+--max-microseconds, adds more than that per call.
+
+    python benchmarks/logging_overhead.py [--calls 20000] [--runs 3] [--max-microseconds 250]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ["none", "text", "async", "json"]
+QUEUED_MODES = ("async", "json")
+
+_PROBE = """
+import json, time
+from loguru import logger
+from settings import Config
+
+config = Config()
+if {mode!r} == "none":
+    logger.remove()
+prompt = "Analyze the following requirements. " * 100
+response = "The system shall provide the following. " * 200
+
+def call():
+    payload = config.loggable_payload(prompt)
+    if payload is not None:
+        logger.debug(f"Stage 'requirements' inputs: {{payload}}")
+    payload = config.loggable_payload(response)
+    if payload is not None:
+        logger.debug(f"Stage 'requirements' response: {{payload}}")
+    logger.debug("Successfully generated completion for stage 'requirements'")
+
+with logger.contextualize(run_id="benchmark", stage="requirements"):
+    for _ in range(min(1000, {calls})):
+        call()
+    logger.complete()
+    start = time.thread_time()
+    for _ in range({calls}):
+        call()
+    elapsed = time.thread_time() - start
+logger.complete()
+print(json.dumps({{"per_call": elapsed / {calls}}}))
+"""
+
+
+def measure(mode, calls):
+    env = dict(os.environ, LOG_MODE=mode if mode != "none" else "text")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(mode=mode, calls=calls)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])["per_call"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--max-microseconds", type=float, default=None)
+    args = parser.parse_args()
+
+    # Modes are interleaved across runs so that host noise hits them alike.
+    samples = {mode: [] for mode in MODES}
+    for _ in range(args.runs):
+        for mode in MODES:
+            samples[mode].append(measure(mode, args.calls))
+    results = {mode: min(values) for mode, values in samples.items()}
+    baseline = results["none"]
+    text = results["text"]
+    print(f"{'mode':<6} {'per call':>10} {'overhead':>10}  (best of {args.runs})")
+    failed = False
+    for mode, per_call in results.items():
+        overhead = (per_call - baseline) * 1e6
+        print(f"{mode:<6} {per_call * 1e6:>8.1f}us {overhead:>8.1f}us")
+        if mode not in QUEUED_MODES:
+            continue
+        if per_call > text * (1 + args.tolerance):
+            print(f"FAIL: {mode} costs more per call than text (tolerance {args.tolerance:.0%})")
+            failed = True
+        if args.max_microseconds is not None and overhead > args.max_microseconds:
+            print(f"FAIL: {mode} adds {overhead:.1f}us per call (threshold {args.max_microseconds:.0f}us)")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
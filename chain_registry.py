@@ -0,0 +1,35 @@
+import threading
+
+# Prompts and chains are compiled once per process and shared by every
+# session. LLMChain and PromptTemplate hold no per-call state, so sharing
+# them across threads is safe.
+_lock = threading.Lock()
+_prompts = {}
+_chains = {}
+
+
+def get_prompt(template):
+    """Return the compiled PromptTemplate for a template string."""
+    with _lock:
+        prompt = _prompts.get(template)
+        if prompt is None:
+            from langchain_core.prompts import PromptTemplate
+
+            prompt = _prompts[template] = PromptTemplate.from_template(template)
+        return prompt
+
+
+def get_chain(template, llm, output_key="text"):
+    """Return the shared LLMChain for a template, LLM and output key."""
+    prompt = get_prompt(template)
+    # LLMs are cached for the life of the process (see groq_client), so
+    # their identity is a stable key.
+    key = (template, id(llm), output_key)
+    with _lock:
+        chain = _chains.get(key)
+        if chain is None:
+            from langchain_classic.chains import LLMChain
+
+            chain = _chains[key] = LLMChain(llm=llm, prompt=prompt, output_key=output_key)
+        return chain
+
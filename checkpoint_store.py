@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from loguru import logger
+
+
+def fingerprint(*parts):
+    """Stable SHA-256 fingerprint of arbitrary JSON-serialisable inputs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, str):
+            data = part.encode("utf-8")
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """Persists completed stage outputs on local disk.
+
+    Each run gets a directory named after its run ID, holding one JSON file
+    per completed stage together with the fingerprint of that stage's inputs.
+    A checkpoint is only reused when the fingerprint still matches, so a
+    changed input re-runs the stage instead of returning stale output.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or os.getenv("CHECKPOINT_DIR", "checkpoints")
+
+    def _path(self, run_id, stage):
+        return os.path.join(self.root, run_id, f"{stage}.json")
+
+    def load(self, run_id, stage, input_fingerprint):
+        path = self._path(run_id, stage)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {path}: {str(e)}")
+            return None
+        if record.get("input_fingerprint") != input_fingerprint:
+            return None
+        return record["output"]
+
+    def save(self, run_id, stage, input_fingerprint, output):
+        path = self._path(run_id, stage)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        record = {
+            "stage": stage,
+            "input_fingerprint": input_fingerprint,
+            "completed_at": time.time(),
+            "output": output,
+        }
+        # Write to a temporary file first so a crash never leaves a
+        # half-written checkpoint behind.
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        os.replace(tmp_path, path)
+        logger.debug(f"Checkpointed stage '{stage}' for run {run_id[:12]}")
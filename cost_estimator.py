@@ -1,7 +1,53 @@
 from loguru import logger
+from ai_analysis import StageFailedError
+from estimation_index import historical_estimates
 from datetime import datetime
-from langchain_classic.chains import LLMChain
-from langchain_core.prompts import PromptTemplate
+
+# Fixed instructions first, then the cost parameters (which rarely change
+# between runs), then the plan, so calls share the longest possible prefix.
+COST_TEMPLATE = """Based on the project plan and cost parameters given at the end of this message, generate a detailed cost estimate.
+
+Provide a detailed cost analysis that includes:
+1. Labor Costs:
+   - Break down by role and phase
+   - Consider complexity and expertise levels
+   - Account for different hourly rates
+
+2. Infrastructure Costs:
+   - Cloud services and hosting
+   - Development environments
+   - Testing and staging setups
+   - Monitoring and security
+
+3. License and Tool Costs:
+   - Development tools
+   - Third-party services
+   - Testing tools
+   - Security and compliance tools
+
+4. Risk Buffer and Contingency:
+   - Risk-based adjustments
+   - Contingency calculations
+   - Buffer recommendations
+
+Format the response in a clear, structured way with detailed breakdowns and explanations.
+
+Check the plan's labor hours against the historical calibration below, which summarizes similar phases from projects we delivered. Where a phase falls outside the typical range, flag it and reflect the difference in the risk buffer.
+
+Cost Parameters:
+- Average hourly rates: {hourly_rates}
+- Infrastructure base cost: {infrastructure_cost}
+- License base cost: {license_cost}
+- Project complexity: {complexity}
+- Risk factor: {risk_factor}
+- Cloud services: {cloud_services}
+- Additional licenses: {additional_licenses}
+
+Historical Calibration:
+{historical_estimates}
+
+Project Plan and Resources:
+{project_plan}"""
 
 class CostEstimator:
     def __init__(self, groq_client):
@@ -9,46 +55,8 @@ class CostEstimator:
         self._setup_chain()
         
     def _setup_chain(self):
-        cost_template = """Based on the provided project plan and resources, generate a detailed cost estimate.
-
-        Project Plan and Resources:
-        {project_plan}
-        
-        Cost Parameters:
-        - Average hourly rates: {hourly_rates}
-        - Infrastructure base cost: {infrastructure_cost}
-        - License base cost: {license_cost}
-        - Project complexity: {complexity}
-        - Risk factor: {risk_factor}
-        - Cloud services: {cloud_services}
-        - Additional licenses: {additional_licenses}
-
-        Provide a detailed cost analysis that includes:
-        1. Labor Costs:
-           - Break down by role and phase
-           - Consider complexity and expertise levels
-           - Account for different hourly rates
-           
-        2. Infrastructure Costs:
-           - Cloud services and hosting
-           - Development environments
-           - Testing and staging setups
-           - Monitoring and security
-           
-        3. License and Tool Costs:
-           - Development tools
-           - Third-party services
-           - Testing tools
-           - Security and compliance tools
-           
-        4. Risk Buffer and Contingency:
-           - Risk-based adjustments
-           - Contingency calculations
-           - Buffer recommendations
-           
-        Format the response in a clear, structured way with detailed breakdowns and explanations."""
-        
-        self.cost_chain = self.groq_client.create_chain(cost_template)
+        # Shared, precompiled chain from the process-wide registry
+        self.cost_chain = self.groq_client.create_chain(COST_TEMPLATE, stage="cost_estimate")
     
     def calculate_costs(self, project_plan, cost_params):
         """Generate cost estimate using LLM analysis."""
@@ -62,13 +70,14 @@ class CostEstimator:
                 "complexity": cost_params.get("complexity_multiplier", "1.0"),
                 "risk_factor": cost_params.get("risk_factor", "1.0"),
                 "cloud_services": ", ".join(cost_params.get("cloud_services", ["Basic cloud setup"])),
-                "additional_licenses": ", ".join(cost_params.get("additional_licenses", ["Standard tools"]))
+                "additional_licenses": ", ".join(cost_params.get("additional_licenses", ["Standard tools"])),
+                "historical_estimates": historical_estimates(project_plan, cost_params.get("complexity_multiplier"))
             }
             
             # Get cost analysis from LLM
-            cost_analysis = self.cost_chain.run(**chain_input)
+            cost_analysis = self.groq_client.run_chain(self.cost_chain, "cost_estimate", **chain_input)
             return cost_analysis
             
         except Exception as e:
             logger.error(f"Error generating cost estimate: {str(e)}")
-            return "Error generating cost estimate. Please check the inputs and try again."
\ No newline at end of file
+            raise StageFailedError("cost_estimate", e) from e
\ No newline at end of file
@@ -1,20 +1,25 @@
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 from loguru import logger
 import io
 
+# Activity rows beyond this are summarized; python-docx tables get slow
+# with thousands of rows.
+MAX_ACTIVITY_ROWS = 200
+
 class DocumentGenerator:
     def __init__(self):
         self.sections = {
+            'revision_changes': self._add_revision_changes_section,
             'requirements': self._add_requirements_section,
             'tech_specs': self._add_technical_specs_section,
             'project_plan': self._add_project_plan_section,
+            'schedule': self._add_schedule_section,
             'cost_estimate': self._add_cost_estimate_section
         }
 
     def generate_documents(self, **sections):
         try:
+            from docx import Document
+
             doc = Document()
             self._add_title(doc)
             self._add_toc(doc)
@@ -29,6 +34,8 @@ class DocumentGenerator:
             raise
 
     def _add_title(self, doc):
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+
         title = doc.add_heading('Project Analysis Report', 0)
         title.alignment = WD_ALIGN_PARAGRAPH.CENTER
         doc.add_paragraph().add_run().add_break()
@@ -38,6 +45,26 @@ class DocumentGenerator:
         toc.style = 'Heading 1'
         doc.add_paragraph().add_run().add_break()
 
+    def _add_revision_changes_section(self, doc, changes):
+        from docx.shared import RGBColor
+
+        added, removed = RGBColor(0x1E, 0x7B, 0x34), RGBColor(0xB0, 0x20, 0x20)
+        heading = doc.add_heading('Revision Changes', 1)
+        doc.add_paragraph('Changes in the revised requirements document. '
+                          'Items marked [UPDATED] in the sections below reflect them.')
+        for change in changes:
+            paragraph = doc.add_paragraph(style='List Bullet')
+            if change['old']:
+                run = paragraph.add_run(change['old'])
+                run.font.strike = True
+                run.font.color.rgb = removed
+            if change['old'] and change['new']:
+                paragraph.add_run(' → ')
+            if change['new']:
+                run = paragraph.add_run(change['new'])
+                run.font.color.rgb = added
+        doc.add_page_break()
+
     def _add_requirements_section(self, doc, content):
         heading = doc.add_heading('Requirements Analysis', 1)
         doc.add_paragraph(content)
@@ -58,6 +85,48 @@ class DocumentGenerator:
             doc.add_paragraph(str(content))
         doc.add_page_break()
 
+    def _add_schedule_section(self, doc, schedule):
+        heading = doc.add_heading('Project Schedule', 1)
+        doc.add_paragraph(
+            f"Critical path duration: {schedule['duration_days']:.1f} working days. "
+            f"With the configured team capacity: {schedule['leveled_duration_days']:.1f} working days."
+        )
+
+        doc.add_heading('Phase Timeline', 2)
+        self._add_table(doc, ['Phase', 'Start (day)', 'Finish (day)', 'Slack (days)', 'Levelled Start', 'Levelled Finish'], [
+            [phase['name'] + (' (critical)' if phase['critical'] else ''), f"{phase['earliest_start']:.1f}",
+             f"{phase['earliest_finish']:.1f}", f"{phase['slack']:.1f}", f"{phase['leveled_start']:.1f}",
+             f"{phase['leveled_finish']:.1f}"]
+            for phase in schedule['phases']
+        ])
+
+        doc.add_heading('Critical Path', 2)
+        for activity in schedule['critical_path']:
+            doc.add_paragraph(activity, style='List Number')
+
+        activities = schedule['activities']
+        doc.add_heading('Activities', 2)
+        self._add_table(doc, ['Phase', 'Activity', 'Role', 'Hours', 'Start (day)', 'Slack (days)'], [
+            [activity['phase'], activity['name'], activity['role'], f"{activity['hours']:.0f}",
+             f"{activity['earliest_start']:.1f}", f"{activity['slack']:.1f}"]
+            for activity in activities[:MAX_ACTIVITY_ROWS]
+        ])
+        if len(activities) > MAX_ACTIVITY_ROWS:
+            doc.add_paragraph(f"... and {len(activities) - MAX_ACTIVITY_ROWS} more activities.")
+
+        for warning in schedule['warnings']:
+            doc.add_paragraph(f"Note: {warning}")
+        doc.add_page_break()
+
+    def _add_table(self, doc, headers, rows):
+        table = doc.add_table(rows=1, cols=len(headers))
+        table.style = 'Table Grid'
+        for cell, header in zip(table.rows[0].cells, headers):
+            cell.text = header
+        for row in rows:
+            for cell, value in zip(table.add_row().cells, row):
+                cell.text = str(value)
+
     def _add_cost_estimate_section(self, doc, content):
         heading = doc.add_heading('Cost Estimate', 1)
         if isinstance(content, dict):
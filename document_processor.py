@@ -1,11 +1,157 @@
-import PyPDF2
-from docx import Document
-from utils import batch_process
+import codecs
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+import xml.etree.ElementTree as ET
 from loguru import logger
 
+# Rough token estimate used for input caps; close enough for English prose.
+CHARS_PER_TOKEN = 4
+READ_BLOCK_SIZE = 64 * 1024
+
+# Sentences shorter than this are too generic ("See Appendix A.") to treat
+# as duplicated content across files.
+MIN_DEDUPE_CHARS = 40
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+
+def iter_docx_blocks(file):
+    """Yield the text blocks of a DOCX file in document order.
+
+    Streams word/document.xml out of the zip with an incremental parser
+    instead of building python-docx's object model. Paragraphs are yielded
+    as-is, headings get a Markdown-style "#" prefix, and each table row is
+    yielded as its cell texts joined with " | ". Nested tables are flattened
+    into the enclosing cell.
+    """
+    with zipfile.ZipFile(file) as archive, archive.open("word/document.xml") as xml:
+        body = None
+        paragraphs = []  # stack of [parts, style]; text boxes nest paragraphs
+        table_depth = 0
+        row = None
+        cell = None
+        skip_depth = 0
+
+        for event, elem in ET.iterparse(xml, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == _MC_FALLBACK:
+                    skip_depth += 1
+                elif skip_depth:
+                    pass
+                elif tag == _W + "body":
+                    body = elem
+                elif tag == _W + "p":
+                    paragraphs.append([[], None])
+                elif tag == _W + "tbl":
+                    table_depth += 1
+                elif tag == _W + "tr" and table_depth == 1:
+                    row = []
+                elif tag == _W + "tc" and table_depth == 1:
+                    cell = []
+                continue
+
+            if tag == _MC_FALLBACK:
+                skip_depth -= 1
+            elif skip_depth:
+                continue
+            elif tag == _W + "t" and paragraphs:
+                paragraphs[-1][0].append(elem.text or "")
+            elif tag in (_W + "tab", _W + "br", _W + "cr") and paragraphs:
+                paragraphs[-1][0].append(" ")
+            elif tag == _W + "pStyle" and paragraphs:
+                paragraphs[-1][1] = elem.get(_W + "val") or ""
+            elif tag == _W + "p" and paragraphs:
+                parts, style = paragraphs.pop()
+                text = "".join(parts).strip()
+                if not text:
+                    pass
+                elif paragraphs:
+                    paragraphs[-1][0].append(f" {text} ")
+                elif cell is not None:
+                    cell.append(text)
+                else:
+                    yield _heading_prefix(style) + text
+            elif tag == _W + "tc" and table_depth == 1 and cell is not None:
+                row.append(" ".join(cell))
+                cell = None
+            elif tag == _W + "tr" and table_depth == 1 and row is not None:
+                if any(row):
+                    yield " | ".join(row)
+                row = None
+            elif tag == _W + "tbl":
+                table_depth -= 1
+
+            # Drop finished top-level blocks so memory stays flat.
+            if body is not None and table_depth == 0 and not paragraphs and tag in (_W + "p", _W + "tbl"):
+                body.clear()
+
+
+def _heading_prefix(style):
+    if not style:
+        return ""
+    if style == "Title":
+        return "# "
+    if style.startswith("Heading") and style[7:].isdigit():
+        return "#" * min(int(style[7:]), 6) + " "
+    return ""
+
+
+class _BoundedText:
+    """Accumulates whitespace-normalised words up to a character budget.
+
+    Memory stays proportional to the budget, not to the input, and callers
+    can stop reading as soon as the budget is full. Words are joined by
+    spaces; a caller can start a new line instead, e.g. between DOCX blocks.
+    """
+
+    def __init__(self, max_chars):
+        self.max_chars = max_chars
+        self.pieces = []
+        self.length = 0
+        self.truncated = False
+
+    @property
+    def full(self):
+        return self.truncated or self.length >= self.max_chars
+
+    def add_words(self, words, separator=' '):
+        """Append words, the first after separator and the rest after spaces."""
+        for word in words:
+            piece = separator + word if self.pieces else word
+            if self.length + len(piece) > self.max_chars:
+                self.truncated = True
+                return False
+            self.pieces.append(piece)
+            self.length += len(piece)
+            separator = ' '
+        return True
+
+    def add_prefix(self, word, separator=' '):
+        """Append as much of word as still fits, and mark the text truncated."""
+        room = self.max_chars - self.length - (len(separator) if self.pieces else 0)
+        if room > 0:
+            self.add_words([word[:room]], separator)
+        self.truncated = True
+
+    def add_text(self, text, separator=' '):
+        return self.add_words(text.split(), separator)
+
+    def text(self):
+        return ''.join(self.pieces)
+
+
 class DocumentProcessor:
-    def __init__(self, chunk_size=4000):
+    def __init__(self, chunk_size=4000, max_bytes=None, max_tokens=None):
         self.chunk_size = chunk_size
+        self.max_bytes = max_bytes or int(os.getenv("MAX_INPUT_BYTES", 200 * 1024 * 1024))
+        # Five chunks' worth of text by default, which is what the analysis
+        # prompts are sized for.
+        self.max_tokens = max_tokens or int(os.getenv("MAX_INPUT_TOKENS", chunk_size * 5 // CHARS_PER_TOKEN))
 
     def process_document(self, file):
         file_extension = file.name.split('.')[-1].lower()
@@ -23,57 +169,154 @@ class DocumentProcessor:
             logger.error(f"Error processing document: {str(e)}")
             raise
 
+    def process_documents(self, files, max_workers=4):
+        """Extract several files in parallel and merge them into one corpus.
+
+        Sentences already seen in an earlier file are dropped, each file's
+        text is prefixed with a source header, and the whole corpus shares
+        the single max_tokens budget. A single file is returned exactly as
+        process_document would return it.
+        """
+        if len(files) == 1:
+            return self.process_document(files[0])
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(files))) as executor:
+            texts = list(executor.map(self.process_document, files))
+
+        sources = _dedupe_sources([(file.name, text) for file, text in zip(files, texts)])
+        return self._merge_sources(sources)
+
+    def _merge_sources(self, sources):
+        headers = [f"=== Source: {name} ===" for name, _ in sources]
+        budget = self.max_tokens * CHARS_PER_TOKEN - sum(len(header) + 2 for header in headers)
+        allowances = _share_budget([len(text) for _, text in sources], max(0, budget))
+
+        sections = []
+        for header, (name, text), allowance in zip(headers, sources, allowances):
+            if len(text) > allowance:
+                logger.warning(f"Truncated {name} to {allowance} chars to fit the shared input budget")
+                text = text[:allowance].rsplit(' ', 1)[0]
+            if text:
+                sections.append(f"{header}\n{text}")
+        return "\n\n".join(sections)
+
+    def _new_buffer(self):
+        return _BoundedText(self.max_tokens * CHARS_PER_TOKEN)
+
+    def _finish(self, buffer, name):
+        if buffer.truncated:
+            logger.warning(f"Truncated {name} to ~{self.max_tokens} tokens ({buffer.length} chars)")
+        return buffer.text()
+
+    # PyPDF2 is imported on first use so non-PDF jobs never load it.
     def _process_pdf(self, file):
+        import PyPDF2
+
         pdf_reader = PyPDF2.PdfReader(file)
-        text_chunks = []
+        buffer = self._new_buffer()
         
         for page in pdf_reader.pages:
-            text = page.extract_text()
-            if text.strip():
-                text_chunks.extend(self._split_into_chunks(text))
+            if not buffer.add_text(page.extract_text() or ''):
+                break
         
-        return self._combine_chunks(text_chunks)
+        return self._finish(buffer, file.name)
 
     def _process_docx(self, file):
-        doc = Document(file)
-        text_chunks = []
-        
-        for paragraph in doc.paragraphs:
-            text = paragraph.text
-            if text.strip():
-                text_chunks.extend(self._split_into_chunks(text))
+        buffer = self._new_buffer()
+
+        try:
+            # One line per paragraph, heading or table row, so the model
+            # still sees where each one ends.
+            for block in iter_docx_blocks(file):
+                if not buffer.add_text(block, separator='\n'):
+                    break
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            raise ValueError(f"Invalid DOCX file: {str(e)}") from e
                 
-        return self._combine_chunks(text_chunks)
+        return self._finish(buffer, file.name)
 
     def _process_txt(self, file):
-        text = file.read().decode('utf-8')
-        text_chunks = self._split_into_chunks(text)
-        return self._combine_chunks(text_chunks)
-
-    def _split_into_chunks(self, text):
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_length = 0
-        
-        for word in words:
-            word_length = len(word) + 1  # +1 for space
-            if current_length + word_length > self.chunk_size:
-                chunks.append(' '.join(current_chunk))
-                current_chunk = [word]
-                current_length = word_length
-            else:
-                current_chunk.append(word)
-                current_length += word_length
-                
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-            
-        return chunks
-
-    def _combine_chunks(self, chunks):
-        def merge_batch(batch):
-            return [' '.join(batch)]
-            
-        # Process chunks in batches of 5
-        return batch_process(chunks, 5, merge_batch)[0]
\ No newline at end of file
+        """Stream the upload in blocks, decoding incrementally.
+
+        Invalid UTF-8 is replaced rather than failing the upload, reading
+        stops at the byte cap or once the token budget is full, and a word
+        split across two blocks is carried over to the next one. A word
+        longer than the remaining budget is cut to fit and ends the read.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        buffer = self._new_buffer()
+        bytes_read = 0
+        carry = ''
+
+        while not buffer.full:
+            if bytes_read >= self.max_bytes:
+                # A file of exactly max_bytes is complete, not truncated.
+                # The byte cap is logged here rather than by _finish, which
+                # reports the token budget.
+                if file.read(1):
+                    logger.warning(f"Stopped reading {file.name} at the {self.max_bytes}-byte input cap")
+                break
+            block = file.read(min(READ_BLOCK_SIZE, self.max_bytes - bytes_read))
+            if not block:
+                break
+            bytes_read += len(block)
+
+            text = carry + decoder.decode(block)
+            words = text.split()
+            carry = ''
+            if words and not text[-1].isspace():
+                carry = words.pop()
+            if not buffer.add_words(words):
+                break
+            # Input without whitespace (minified JSON, one-line dumps) would
+            # otherwise grow the carried word, and re-copy it, with every
+            # block. Once it cannot fit, keep the part that does and stop.
+            if len(carry) > buffer.max_chars - buffer.length:
+                buffer.add_prefix(carry)
+                break
+
+        if not buffer.full:
+            buffer.add_text(carry + decoder.decode(b'', final=True))
+        return self._finish(buffer, file.name)
+
+
+def _dedupe_sources(sources):
+    """Drop sentences from later sources that already appeared in an earlier one.
+
+    Line breaks between the remaining sentences are kept.
+    """
+    seen = set()
+    deduped = []
+    for name, text in sources:
+        lines = []
+        keys = set()
+        dropped = 0
+        for line in text.split('\n'):
+            kept = []
+            for sentence in _SENTENCE_END.split(line):
+                key = ' '.join(sentence.lower().split())
+                if len(key) >= MIN_DEDUPE_CHARS:
+                    if key in seen:
+                        dropped += 1
+                        continue
+                    keys.add(key)
+                kept.append(sentence)
+            if kept:
+                lines.append(' '.join(kept))
+        seen |= keys
+        if dropped:
+            logger.info(f"Dropped {dropped} sentences from {name} already present in earlier files")
+        deduped.append((name, '\n'.join(lines)))
+    return deduped
+
+
+def _share_budget(lengths, budget):
+    """Split a character budget across sources, giving unused share to longer ones."""
+    allowances = [0] * len(lengths)
+    remaining = budget
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for position, index in enumerate(order):
+        share = remaining // (len(order) - position)
+        allowances[index] = min(lengths[index], share)
+        remaining -= allowances[index]
+    return allowances
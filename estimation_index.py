@@ -0,0 +1,229 @@
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from loguru import logger
+
+ROLES = ["Junior Developer", "Senior Developer", "Project Manager", "Designer"]
+
+# Phase names are mapped to a canonical type by keyword; analogues are only
+# searched within the same type.
+PHASE_TYPES = {
+    "discovery": ("discovery", "requirement", "analysis", "inception", "planning", "scoping"),
+    "design": ("design", "architecture", "prototype", "ux", "ui", "wireframe"),
+    "development": ("development", "implementation", "build", "coding", "integration", "backend", "frontend"),
+    "testing": ("testing", "test", "qa", "quality", "verification", "uat"),
+    "deployment": ("deployment", "launch", "release", "go-live", "rollout", "migration"),
+    "maintenance": ("maintenance", "support", "handover", "training", "stabilization", "hypercare"),
+}
+OTHER_PHASE = "other"
+PHASE_TYPE_NAMES = list(PHASE_TYPES) + [OTHER_PHASE]
+
+TAG_BUCKETS = 64
+COMPLEXITY_WEIGHT = 0.5
+NEIGHBORS = 20
+EXAMPLES = 2
+
+_WORD = re.compile(r"[a-z0-9][a-z0-9.+#/-]*")
+NO_HISTORY = "No historical phase data is available; estimate from the specifications alone."
+
+
+def phase_type(name):
+    words = set(_words(name))
+    for type_name, keywords in PHASE_TYPES.items():
+        if words.intersection(keywords):
+            return type_name
+    return OTHER_PHASE
+
+
+def _words(text):
+    return [word.rstrip(".") for word in _WORD.findall((text or "").lower())]
+
+
+def _terms(text):
+    """Words and adjacent word pairs of text, for matching one- and two-word tags."""
+    words = _words(text)
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def _tag_vector(np, tags):
+    vector = np.zeros(TAG_BUCKETS, dtype=np.float32)
+    for tag in tags:
+        vector[zlib.crc32(tag.lower().encode("utf-8")) % TAG_BUCKETS] = 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def build_index(records, path):
+    """Write an estimation index of delivered phases to an .npz file.
+
+    Each record is a dict with project, phase, hours, complexity (the
+    1.0-2.0 factor used in cost settings), roles (hours or shares per role
+    in ROLES) and tags (tech stack). Returns the number of phases written.
+    """
+    import numpy as np
+
+    records = [record for record in records if float(record.get("hours") or 0) > 0]
+    tag_vectors, roles, vocabulary = [], [], set()
+    for record in records:
+        tags = [tag.lower() for tag in record.get("tags", [])]
+        vocabulary.update(tags)
+        tag_vectors.append(_tag_vector(np, tags))
+        role_hours = np.array([float(record.get("roles", {}).get(role, 0)) for role in ROLES], dtype=np.float32)
+        total = role_hours.sum()
+        roles.append(role_hours / total if total else role_hours)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Plain (uncompressed) arrays of fixed-width types: loading needs no
+    # pickling and each array is read in one pass.
+    np.savez(
+        path,
+        tags=np.array(tag_vectors, dtype=np.float32).reshape(len(records), TAG_BUCKETS),
+        complexity=np.array([float(record.get("complexity") or 1.0) for record in records], dtype=np.float32),
+        hours=np.array([float(record["hours"]) for record in records], dtype=np.float32),
+        roles=np.array(roles, dtype=np.float32).reshape(len(records), len(ROLES)),
+        phase_type=np.array([PHASE_TYPE_NAMES.index(phase_type(record["phase"])) for record in records], dtype=np.int8),
+        phase=np.array([str(record["phase"])[:64] for record in records], dtype="U64"),
+        project=np.array([str(record.get("project", ""))[:64] for record in records], dtype="U64"),
+        vocabulary=np.array(sorted(vocabulary), dtype="U48"),
+    )
+    logger.info(f"Wrote estimation index of {len(records)} phases to {path}")
+    return len(records)
+
+
+class EstimationIndex:
+    """Nearest-neighbour lookup of historical phases for calibrating estimates.
+
+    Phases are grouped by canonical type at load time. A query ranks a
+    type's phases by squared distance over the hashed tech-tag vector plus
+    a weighted complexity term, takes the closest NEIGHBORS with
+    argpartition and reports their hour percentiles and typical role mix.
+    """
+
+    def __init__(self, path):
+        import numpy as np
+
+        self.path = path
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        self.size = len(arrays["hours"])
+        self.vocabulary = set(arrays["vocabulary"].tolist())
+        self._groups = {}
+        for type_id, type_name in enumerate(PHASE_TYPE_NAMES):
+            rows = np.flatnonzero(arrays["phase_type"] == type_id)
+            if not len(rows):
+                continue
+            tags = np.ascontiguousarray(arrays["tags"][rows])
+            self._groups[type_name] = {
+                "tags": tags,
+                "tag_norms": np.einsum("ij,ij->i", tags, tags),
+                "complexity": arrays["complexity"][rows],
+                "hours": arrays["hours"][rows],
+                "roles": arrays["roles"][rows],
+                "phase": arrays["phase"][rows],
+                "project": arrays["project"][rows],
+            }
+
+    def query(self, type_name, tags, complexity=None, k=NEIGHBORS):
+        """Return calibration for one phase type, or None if it has no history."""
+        import numpy as np
+
+        group = self._groups.get(type_name)
+        if group is None:
+            return None
+        q = _tag_vector(np, tags)
+        distances = group["tag_norms"] - 2.0 * (group["tags"] @ q) + float(q @ q)
+        if complexity is not None:
+            distances = distances + COMPLEXITY_WEIGHT * (group["complexity"] - float(complexity)) ** 2
+        k = min(k, len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest])]
+        hours = group["hours"][nearest]
+        p10, p25, p50, p75, p90 = np.percentile(hours, [10, 25, 50, 75, 90])
+        return {
+            "phase_type": type_name,
+            "analogues": int(k),
+            "hours": {"p10": float(p10), "p25": float(p25), "median": float(p50), "p75": float(p75), "p90": float(p90)},
+            "role_mix": dict(zip(ROLES, group["roles"][nearest].mean(axis=0).round(2).tolist())),
+            "examples": [
+                {"phase": str(group["phase"][i]), "project": str(group["project"][i]), "hours": float(group["hours"][i])}
+                for i in nearest[:EXAMPLES]
+            ],
+        }
+
+    def calibrate(self, text, complexity=None):
+        """Calibration for the phase types mentioned in text (all types if none are)."""
+        terms = _terms(text)
+        tags = sorted(terms & self.vocabulary)
+        mentioned = [name for name, keywords in PHASE_TYPES.items() if terms.intersection(keywords)]
+        results = [self.query(name, tags, complexity) for name in mentioned or list(PHASE_TYPES)]
+        return [result for result in results if result is not None], tags
+
+
+def format_calibration(results, tags):
+    """Render calibration results as prompt text."""
+    if not results:
+        return NO_HISTORY
+    lines = [f"Matched tech stack tags: {', '.join(tags) if tags else 'none'}"]
+    for result in results:
+        hours = result["hours"]
+        roles = ", ".join(f"{role} {share:.0%}" for role, share in result["role_mix"].items() if share)
+        examples = "; ".join(
+            f"{example['phase']} ({example['project']}, {example['hours']:.0f}h)" for example in result["examples"]
+        )
+        lines.append(
+            f"- {result['phase_type'].title()}: median {hours['median']:.0f}h, typical range "
+            f"{hours['p25']:.0f}-{hours['p75']:.0f}h (p10-p90 {hours['p10']:.0f}-{hours['p90']:.0f}h) "
+            f"from {result['analogues']} similar delivered phases; role mix: {roles or 'n/a'}; e.g. {examples}"
+        )
+    return "\n".join(lines)
+
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+def _index_path():
+    return os.getenv("ESTIMATION_INDEX_PATH", "data/estimation_index.npz")
+
+def index_version():
+    """Identify the index file on disk (None if there is none), for checkpoint fingerprints."""
+    path = _index_path()
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def get_estimation_index():
+    """Return the loaded index, reloading it if the file changed; None without one."""
+    global _index, _index_version
+    version = index_version()
+    with _index_lock:
+        if version != _index_version:
+            _index, _index_version = None, version
+            if version is not None:
+                try:
+                    _index = EstimationIndex(_index_path())
+                    logger.info(f"Loaded estimation index with {_index.size} historical phases")
+                except Exception as e:
+                    logger.warning(f"Could not load estimation index: {str(e)}")
+        return _index
+
+def historical_estimates(text, complexity=None):
+    """Prompt text with calibrated hour ranges for the phases text describes."""
+    index = get_estimation_index()
+    if index is None:
+        return NO_HISTORY
+    return format_calibration(*index.calibrate(text, complexity))
+
+
+if __name__ == "__main__":
+    # python estimation_index.py phases.jsonl [output.npz]
+    with open(sys.argv[1], encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    build_index(records, sys.argv[2] if len(sys.argv) > 2 else _index_path())
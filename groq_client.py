@@ -1,49 +1,341 @@
-from langchain_groq import ChatGroq
-from langchain.messages import HumanMessage
-from langchain_core.prompts import PromptTemplate
-from langchain_classic.chains import LLMChain
-from utils import rate_limit, retry_with_exponential_backoff
+from utils import retry_with_exponential_backoff
+from model_profiles import get_profile
+from metrics import metrics
+from resilience import CircuitBreaker, DeadlineExceededError
+from settings import get_config
+from llm_transport import get_http_client, get_async_http_client
+from output_budget import output_budget
+from chain_registry import get_chain, get_prompt
+from llm_scheduler import INTERACTIVE, current_tenant, get_llm_scheduler, tenant_of
+from singleflight import SingleFlight, WaitTimeoutError
+from checkpoint_store import fingerprint
+from concurrent.futures import CancelledError
 from loguru import logger
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import contextvars
 import os
-from dotenv import load_dotenv
+import threading
+import time
+
+# Shared pool for deadline-bound and hedged LLM calls.
+_call_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-call")
+
+# One breaker guards every request to the provider. Retries and the breaker
+# sit inside the coalesced completion, so each request is counted once
+# however many callers share it; the quota is shared out by the fair
+# scheduler before each request.
+groq_circuit_breaker = CircuitBreaker("groq", failure_threshold=5, recovery_timeout=30.0)
+
+# Chat models are shared by every GroqClient in the process; they are
+# stateless apart from the pooled HTTP transport, which is thread-safe.
+# Fallback models are keyed by id() of the primary they stand in for.
+_llm_cache = {}
+_fallback_models = {}
+_llm_cache_lock = threading.Lock()
+
+# Identical completions requested while one is already running share it.
+_completion_flights = SingleFlight("completion")
+
+# A completion cut off by max_tokens is continued at most this many times.
+MAX_CONTINUATIONS = 3
+CONTINUATION_PROMPT = (
+    "Your previous answer was cut off. Continue exactly where it stopped, "
+    "without repeating any earlier text or adding a preamble."
+)
+
+# Hedging only kicks in once a stage has enough latency history for the
+# percentile to mean something.
+MIN_HEDGE_SAMPLES = 20
+
+
+class StageTimeoutError(DeadlineExceededError):
+    """Raised when a stage call does not finish within its deadline."""
+
+    def __init__(self, stage, deadline):
+        super().__init__(f"Stage '{stage}' exceeded its {deadline:.0f}s deadline")
+        self.stage = stage
+        self.deadline = deadline
+
+
+def _should_fall_back(exc):
+    import groq
+
+    return isinstance(exc, (groq.RateLimitError, groq.APITimeoutError))
+
+
+def _join_flight(flight_context):
+    # A flight's requests queue as its first caller. An interactive caller
+    # joining, e.g. one reaching a document still being pre-analysed in the
+    # background, lifts them to the interactive class.
+    if current_tenant().priority == INTERACTIVE:
+        get_llm_scheduler().promote(tenant_of(flight_context))
+
+
+def _was_truncated(message):
+    metadata = getattr(message, "response_metadata", None) or {}
+    return metadata.get("finish_reason") == "length"
+
+
+def _output_tokens(message):
+    usage = getattr(message, "usage_metadata", None) or {}
+    if usage.get("output_tokens"):
+        return usage["output_tokens"]
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("completion_tokens"):
+        return token_usage["completion_tokens"]
+    # Rough estimate when the provider reports no usage.
+    return len(message.content) // 4
 
-load_dotenv(override=True)
 
 class GroqClient:
     def __init__(self):
-        self.llm = None
+        self._initialized = False
 
     def initialize(self):
-        self.llm = ChatGroq(
+        # Heavy imports and the ChatGroq construction are deferred to the
+        # first real call, so workers that never reach the LLM (TXT-only or
+        # cache-hit runs) don't pay for them.
+        from dotenv import load_dotenv
+
+        load_dotenv(override=True)
+        self._initialized = True
+
+    @property
+    def llm(self):
+        return self.get_llm("default")
+
+    def get_llm(self, stage="default"):
+        """Return the LLM for a pipeline stage, built from its model profile.
+
+        Completions fall back to the profile's alternate model when the
+        primary is rate-limited or times out (see _request).
+        """
+        if not self._initialized:
+            return None
+        profile = get_profile(stage)
+        key = (stage, os.getenv("GROQ_API_KEY"), tuple(sorted(profile.items())))
+        with _llm_cache_lock:
+            if key not in _llm_cache:
+                _llm_cache[key] = self._build_llm(stage, profile)
+            return _llm_cache[key]
+
+    def _build_llm(self, stage, profile):
+        # Called with _llm_cache_lock held.
+        llm = self._build_chat_model(profile["model"], profile)
+        if profile.get("fallback_model") and profile["fallback_model"] != profile["model"]:
+            _fallback_models[id(llm)] = self._build_chat_model(profile["fallback_model"], profile)
+        logger.debug(f"Resolved model for stage '{stage}': {profile['model']} (fallback: {profile.get('fallback_model')})")
+        return llm
+
+    def _build_chat_model(self, model_name, profile):
+        from langchain_groq import ChatGroq
+
+        # The SDK's own retries and LangChain fallbacks would send requests
+        # past the quota scheduler, so both are handled in _request instead.
+        return ChatGroq(
             groq_api_key=os.getenv("GROQ_API_KEY"),
-            model_name="meta-llama/llama-4-scout-17b-16e-instruct",
-            max_tokens=3000,
-            temperature=0.7
+            model_name=model_name,
+            max_tokens=profile["max_tokens"],
+            temperature=profile["temperature"],
+            timeout=profile["timeout"],
+            max_retries=0,
+            http_client=get_http_client(),
+            http_async_client=get_async_http_client()
         )
 
-    @retry_with_exponential_backoff(max_retries=3)
-    @rate_limit(calls=50, period=60)  # 50 calls per minute
-    def generate_completion(self, prompt, template=None, **kwargs):
-        if not self.llm:
+    def run_chain(self, chain, stage="default", **inputs):
+        """Render a chain's prompt and complete it under the stage deadline."""
+        config = get_config()
+        prompt_payload = config.loggable_payload(inputs)
+        if prompt_payload is not None:
+            logger.debug(f"Stage '{stage}' inputs: {prompt_payload}")
+        response = self.complete(chain.prompt.format(**inputs), stage, llm=chain.llm)
+        response_payload = config.loggable_payload(response)
+        if response_payload is not None:
+            logger.debug(f"Stage '{stage}' response: {response_payload}")
+        return response
+
+    def complete(self, prompt, stage="default", llm=None):
+        """Complete a prompt with a learned output budget, continuing if truncated.
+
+        max_tokens comes from the stage's OutputBudget. When the model stops
+        because it hit that limit, the partial answer is sent back with a
+        request to continue, and the pieces are stitched together.
+
+        Callers requesting the same prompt from the same model and budget
+        while a completion is in flight (several sessions opening one RFP)
+        share that completion. Each caller waits at most the stage deadline
+        and raises StageTimeoutError after it.
+        """
+        llm = llm or self.get_llm(stage)
+        max_tokens = output_budget.budget_for(stage)
+        deadline = get_profile(stage)["deadline"]
+        # Chat models are cached per stage and profile, so the instance
+        # identifies the model and its settings.
+        key = fingerprint(str(id(llm)), stage, max_tokens, prompt)
+        try:
+            return _completion_flights.do(
+                key, lambda cancelled: self._complete(prompt, stage, llm, max_tokens, cancelled),
+                timeout=deadline, on_join=_join_flight
+            )
+        except WaitTimeoutError:
+            raise StageTimeoutError(stage, deadline) from None
+
+    def _complete(self, prompt, stage, llm, max_tokens, cancelled):
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        # One deadline covers the whole completion: queueing for quota and
+        # every continuation draw from the same budget.
+        deadline_at = time.monotonic() + get_profile(stage)["deadline"]
+        messages = [HumanMessage(content=prompt)]
+        parts = []
+        output_tokens = 0
+
+        for attempt in range(MAX_CONTINUATIONS + 1):
+            if cancelled.is_set():
+                raise CancelledError(f"Stage '{stage}' completion cancelled; no callers left")
+            message = self._request(stage, llm, messages, max_tokens, deadline_at=deadline_at)
+            parts.append(message.content)
+            output_tokens += _output_tokens(message)
+            if not _was_truncated(message):
+                break
+            if attempt == MAX_CONTINUATIONS:
+                metrics.increment(f"llm.{stage}.truncated")
+                logger.warning(f"Stage '{stage}' still truncated after {MAX_CONTINUATIONS} continuations")
+                break
+            metrics.increment(f"llm.{stage}.continuations")
+            logger.info(f"Stage '{stage}' hit its {max_tokens}-token limit; requesting a continuation")
+            messages = [
+                HumanMessage(content=prompt),
+                AIMessage(content="".join(parts)),
+                HumanMessage(content=CONTINUATION_PROMPT)
+            ]
+            max_tokens = get_profile(stage)["max_tokens"]
+
+        output_budget.record(stage, output_tokens)
+        return "".join(parts)
+
+    @retry_with_exponential_backoff(max_retries=3, circuit_breaker=groq_circuit_breaker, deadline_arg="deadline_at")
+    def _request(self, stage, llm, messages, max_tokens, deadline_at):
+        """Send one request, falling back to the stage's alternate model if the
+        primary is rate-limited or times out.
+
+        Every request, fallbacks and continuations included, first waits its
+        turn for a share of the provider quota; a wait that outlasts the
+        deadline raises QueueTimeoutError.
+        """
+        models = [llm]
+        if id(llm) in _fallback_models:
+            models.append(_fallback_models[id(llm)])
+        for model in models:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise StageTimeoutError(stage, get_profile(stage)["deadline"])
+            get_llm_scheduler().acquire(timeout=remaining)
+            try:
+                return self.call_with_deadline(
+                    stage, lambda model=model: model.invoke(messages, max_tokens=max_tokens), deadline_at=deadline_at
+                )
+            except Exception as e:
+                if model is models[-1] or not _should_fall_back(e):
+                    raise
+                metrics.increment(f"llm.{stage}.fallback")
+                logger.warning(f"Stage '{stage}' falling back to {models[-1].model_name}: {str(e)}")
+
+    def call_with_deadline(self, stage, func, deadline_at=None):
+        """Call func under the stage's deadline.
+
+        deadline_at is the time.monotonic() by which the call must finish,
+        for callers spreading one deadline over several calls; it defaults
+        to the profile deadline from now. Raises StageTimeoutError, which is
+        not retried, once the deadline passes. Abandoned attempts
+        are cancelled if they have not started yet; attempts already in flight
+        are bounded by the per-request timeout and their results discarded.
+        """
+        profile = get_profile(stage)
+        deadline = profile["deadline"]
+        hedge_delay = self._hedge_delay(stage, profile.get("hedge_percentile"))
+        start = time.monotonic()
+        if deadline_at is None:
+            deadline_at = start + deadline
+        pending = {self._submit(func)}
+        hedge = None
+        error = None
+
+        try:
+            while pending:
+                now = time.monotonic()
+                elapsed = now - start
+                remaining = deadline_at - now
+                if remaining <= 0:
+                    break
+                timeout = remaining
+                if hedge_delay is not None and hedge is None:
+                    timeout = min(remaining, max(0.0, hedge_delay - elapsed))
+
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        latency = time.monotonic() - start
+                        metrics.observe(f"llm.{stage}.latency", latency)
+                        if future is hedge:
+                            metrics.increment(f"llm.{stage}.hedge_won")
+                        return future.result()
+                    error = future.exception()
+
+                if not done and hedge_delay is not None and hedge is None:
+                    # A hedge is an extra request, so it only goes out if
+                    # the quota has a slot free right now.
+                    if not get_llm_scheduler().try_acquire():
+                        metrics.increment(f"llm.{stage}.hedge_skipped")
+                        hedge_delay = None
+                        continue
+                    hedge = self._submit(func)
+                    pending.add(hedge)
+                    metrics.increment(f"llm.{stage}.hedged")
+                    logger.debug(f"Hedging stage '{stage}' after {hedge_delay:.1f}s")
+        finally:
+            for future in pending:
+                future.cancel()
+
+        if error is not None and not pending:
+            raise error
+        metrics.increment(f"llm.{stage}.deadline_exceeded")
+        logger.warning(f"Stage '{stage}' exceeded its {deadline:.0f}s deadline")
+        raise StageTimeoutError(stage, deadline)
+
+    def _submit(self, func):
+        # Each attempt runs in a copy of the caller's context so log records
+        # from the worker thread keep the caller's run and stage IDs.
+        return _call_executor.submit(contextvars.copy_context().run, func)
+
+    def _hedge_delay(self, stage, percentile):
+        if percentile is None:
+            return None
+        if metrics.sample_count(f"llm.{stage}.latency") < MIN_HEDGE_SAMPLES:
+            return None
+        return metrics.percentile(f"llm.{stage}.latency", percentile)
+
+    def generate_completion(self, prompt, template=None, stage="default", **kwargs):
+        llm = self.get_llm(stage)
+        if not llm:
             raise ValueError("Client not initialized.")
 
         try:
             if template:
-                prompt_template = PromptTemplate.from_template(template)
-                chain = LLMChain(llm=self.llm, prompt=prompt_template)
-                response = chain.run(**kwargs)
-            else:
-                messages = [HumanMessage(content=prompt)]
-                response = self.llm.invoke(messages).content
-            logger.debug(f"Successfully generated completion for prompt: {prompt[:100]}...")
+                prompt = get_prompt(template).format(**kwargs)
+            response = self.complete(prompt, stage, llm=llm)
+            payload = get_config().loggable_payload(prompt)
+            if payload is not None:
+                logger.debug(f"Successfully generated completion for prompt: {payload}")
             return response
         except Exception as e:
             logger.error(f"Error generating completion: {str(e)}")
             raise
 
-    @retry_with_exponential_backoff(max_retries=3)
-    @rate_limit(calls=50, period=60)
-    def create_chain(self, prompt_template):
-        if not self.llm:
+    def create_chain(self, prompt_template, stage="default", output_key="text"):
+        """Return the shared chain for a template, bound to the stage's model."""
+        llm = self.get_llm(stage)
+        if not llm:
             raise ValueError("Client not initialized.")
-        return LLMChain(llm=self.llm, prompt=PromptTemplate.from_template(prompt_template))
\ No newline at end of file
+        return get_chain(prompt_template, llm, output_key)
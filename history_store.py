@@ -0,0 +1,222 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from loguru import logger
+
+OUTPUT_FIELDS = ["requirements", "tech_specs", "architecture", "project_plan", "cost_estimate"]
+SEARCH_FIELDS = ["requirements", "tech_specs", "project_plan"]
+
+
+class HistoryStore:
+    """SQLite-backed store of completed analysis runs.
+
+    Run metadata, stage outputs and the generated DOCX live in separate
+    tables, so listing and searching never read the large columns. Full-text
+    search uses an FTS5 index over requirements, specs and plans when the
+    SQLite build has FTS5; otherwise it falls back to LIKE matching.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("HISTORY_DB", "data/history.db")
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self.fts_enabled = False
+        self._init_schema()
+
+    def _connection(self):
+        # sqlite3 connections are not shared between threads; each Streamlit
+        # session thread gets its own.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connection()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    file_name TEXT,
+                    document_hash TEXT NOT NULL,
+                    cost_params TEXT,
+                    timings TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_document_hash ON runs(document_hash)")
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS run_outputs (
+                    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+                    {", ".join(f"{field} TEXT" for field in OUTPUT_FIELDS)}
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS completion_lengths (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    stage TEXT NOT NULL,
+                    tokens INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_completion_lengths_stage ON completion_lengths(stage, id)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS run_documents (
+                    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+                    docx BLOB
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS run_sources (
+                    run_id INTEGER PRIMARY KEY REFERENCES runs(id) ON DELETE CASCADE,
+                    source_text TEXT,
+                    base_run_id INTEGER,
+                    changes TEXT
+                )
+            """)
+        try:
+            with conn:
+                conn.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5(
+                        {", ".join(SEARCH_FIELDS)},
+                        content='run_outputs', content_rowid='run_id'
+                    )
+                """)
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable, history search falls back to LIKE: {str(e)}")
+
+    def save_run(self, file_name, document_hash, cost_params, outputs, docx_bytes=None, timings=None,
+                 source_text=None, base_run_id=None, changes=None):
+        """Store a completed run and return its ID.
+
+        source_text is the extracted document, kept so a later revision can
+        be diffed against it; base_run_id and changes record the run this
+        one revised and what changed since.
+        """
+        conn = self._connection()
+        values = [str(outputs.get(field) or "") for field in OUTPUT_FIELDS]
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (created_at, file_name, document_hash, cost_params, timings) VALUES (?, ?, ?, ?, ?)",
+                (time.time(), file_name, document_hash, json.dumps(cost_params, default=str), json.dumps(timings or {}))
+            )
+            run_id = cursor.lastrowid
+            conn.execute(
+                f"INSERT INTO run_outputs (run_id, {', '.join(OUTPUT_FIELDS)}) VALUES (?, {', '.join('?' for _ in OUTPUT_FIELDS)})",
+                [run_id] + values
+            )
+            conn.execute("INSERT INTO run_documents (run_id, docx) VALUES (?, ?)", (run_id, docx_bytes))
+            conn.execute(
+                "INSERT INTO run_sources (run_id, source_text, base_run_id, changes) VALUES (?, ?, ?, ?)",
+                (run_id, source_text, base_run_id, json.dumps(changes) if changes is not None else None)
+            )
+            if self.fts_enabled:
+                conn.execute(
+                    f"INSERT INTO runs_fts (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (?, {', '.join('?' for _ in SEARCH_FIELDS)})",
+                    [run_id] + [str(outputs.get(field) or "") for field in SEARCH_FIELDS]
+                )
+        logger.info(f"Saved run {run_id} for {file_name} to history")
+        return run_id
+
+    def list_runs(self, limit=50, offset=0):
+        rows = self._connection().execute(
+            "SELECT id, created_at, file_name, document_hash FROM runs ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            (limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query, limit=50):
+        """Return runs whose requirements, specs or plan match the query, best first."""
+        terms = query.split()
+        if not terms:
+            return self.list_runs(limit)
+        conn = self._connection()
+        if self.fts_enabled:
+            # Quote every term so user input can't be parsed as FTS syntax.
+            match = " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+            rows = conn.execute(
+                """
+                SELECT runs.id, runs.created_at, runs.file_name, runs.document_hash
+                FROM runs_fts JOIN runs ON runs.id = runs_fts.rowid
+                WHERE runs_fts MATCH ?
+                ORDER BY bm25(runs_fts)
+                LIMIT ?
+                """,
+                (match, limit)
+            ).fetchall()
+        else:
+            clauses = " AND ".join(
+                "(" + " OR ".join(f"run_outputs.{field} LIKE ?" for field in SEARCH_FIELDS) + ")" for _ in terms
+            )
+            params = [f"%{term}%" for term in terms for _ in SEARCH_FIELDS]
+            rows = conn.execute(
+                f"""
+                SELECT runs.id, runs.created_at, runs.file_name, runs.document_hash
+                FROM runs JOIN run_outputs ON run_outputs.run_id = runs.id
+                WHERE {clauses}
+                ORDER BY runs.created_at DESC
+                LIMIT ?
+                """,
+                params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_completion_length(self, stage, tokens):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT INTO completion_lengths (stage, tokens, created_at) VALUES (?, ?, ?)",
+                (stage, int(tokens), time.time())
+            )
+
+    def recent_completion_lengths(self, stage, limit=200):
+        rows = self._connection().execute(
+            "SELECT tokens FROM completion_lengths WHERE stage = ? ORDER BY id DESC LIMIT ?",
+            (stage, limit)
+        ).fetchall()
+        return [row["tokens"] for row in reversed(rows)]
+
+    def load_run(self, run_id):
+        """Return everything stored for a run, or None if it doesn't exist."""
+        conn = self._connection()
+        run = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if run is None:
+            return None
+        outputs = conn.execute("SELECT * FROM run_outputs WHERE run_id = ?", (run_id,)).fetchone()
+        document = conn.execute("SELECT docx FROM run_documents WHERE run_id = ?", (run_id,)).fetchone()
+        source = conn.execute("SELECT * FROM run_sources WHERE run_id = ?", (run_id,)).fetchone()
+        return {
+            "id": run["id"],
+            "created_at": run["created_at"],
+            "file_name": run["file_name"],
+            "document_hash": run["document_hash"],
+            "cost_params": json.loads(run["cost_params"] or "{}"),
+            "timings": json.loads(run["timings"] or "{}"),
+            "outputs": {field: outputs[field] for field in OUTPUT_FIELDS} if outputs else {},
+            "docx": document["docx"] if document else None,
+            "source_text": source["source_text"] if source else None,
+            "base_run_id": source["base_run_id"] if source else None,
+            "changes": json.loads(source["changes"]) if source and source["changes"] else None,
+        }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_history_store():
+    """Return the process-wide HistoryStore."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore()
+        return _store
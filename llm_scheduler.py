@@ -0,0 +1,218 @@
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from loguru import logger
+from metrics import metrics
+from resilience import RequestNotSentError
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITIES = (INTERACTIVE, BATCH)
+
+
+class QueueTimeoutError(RequestNotSentError):
+    """Raised when a call waits longer than its timeout for a quota slot."""
+
+    def __init__(self, session_id, timeout):
+        super().__init__(f"LLM call for session {session_id[:8]} waited over {timeout:.0f}s for a quota slot")
+        self.session_id = session_id
+        self.timeout = timeout
+
+
+class Tenant:
+    """Who an LLM call is made for: a session, its priority class and its weight."""
+
+    def __init__(self, session_id, priority=INTERACTIVE, weight=1.0):
+        self.session_id = session_id
+        self.priority = priority
+        self.weight = weight
+
+
+DEFAULT_TENANT = Tenant("default")
+_current_tenant = contextvars.ContextVar("llm_tenant", default=DEFAULT_TENANT)
+
+
+def current_tenant():
+    return _current_tenant.get()
+
+
+def tenant_of(context):
+    """The tenant that calls made in a copied contextvars.Context are attributed to."""
+    return context.get(_current_tenant, DEFAULT_TENANT)
+
+
+def set_tenant(tenant):
+    """Attribute LLM calls made from the current context to tenant."""
+    return _current_tenant.set(tenant)
+
+
+@contextmanager
+def use_tenant(tenant):
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+class _Ticket:
+    def __init__(self, tag, seq, tenant):
+        self.tag = tag
+        self.seq = seq
+        self.tenant = tenant
+        self.priority = tenant.priority
+        self.enqueued = time.monotonic()
+
+    def __lt__(self, other):
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class FairScheduler:
+    """Weighted fair queue in front of the provider's request quota.
+
+    Calls are released at the quota rate, one every period/calls seconds.
+    Interactive calls go before batch calls, but batch still gets
+    batch_share of the slots while it has calls waiting, so it is slowed
+    down rather than starved. Within a class, sessions share slots in
+    proportion to their weights by self-clocked fair queuing: each call is
+    tagged max(class virtual time, session's previous tag) + 1 / weight and
+    the lowest tag goes next, so a session queuing hundreds of calls only
+    delays itself.
+    """
+
+    def __init__(self, calls, period, batch_share=0.1):
+        self.interval = period / calls
+        self.batch_share = batch_share
+        self._cond = threading.Condition()
+        self._queues = {priority: [] for priority in PRIORITIES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._last_tags = {}
+        self._batch_credit = 0.0
+        self._next_slot = 0.0
+        self._seq = itertools.count()
+
+    def acquire(self, timeout=None):
+        """Block until the current tenant's call may go out.
+
+        Raises QueueTimeoutError if timeout seconds pass first; the call
+        then gives up its place in the queue.
+        """
+        tenant = current_tenant()
+        with self._cond:
+            ticket = self._enqueue(tenant)
+            deadline = ticket.enqueued + timeout if timeout is not None else None
+            while True:
+                now = time.monotonic()
+                is_head = self._head() is ticket
+                if is_head and now >= self._next_slot:
+                    self._dispatch(ticket, now)
+                    break
+                if deadline is not None and now >= deadline:
+                    self._remove(ticket)
+                    metrics.increment(f"scheduler.{ticket.priority}.timed_out")
+                    logger.warning(f"LLM call for session {tenant.session_id[:8]} timed out in the queue")
+                    raise QueueTimeoutError(tenant.session_id, timeout)
+                wait = self._next_slot - now if is_head else None
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self._cond.wait(wait)
+
+        metrics.observe(f"scheduler.{ticket.priority}.wait", time.monotonic() - ticket.enqueued)
+
+    def try_acquire(self):
+        """Take a slot for the current tenant only if one is free now and no
+        call is queued; never waits. For optional extra requests like hedges."""
+        tenant = current_tenant()
+        with self._cond:
+            now = time.monotonic()
+            if now < self._next_slot or any(self._queues.values()):
+                return False
+            self._dispatch(self._enqueue(tenant), now)
+        return True
+
+    def promote(self, tenant):
+        """Move a batch tenant, and any calls it has queued, to the interactive class.
+
+        Used when a user starts waiting on work that began in the background.
+        """
+        with self._cond:
+            if tenant.priority == INTERACTIVE:
+                return
+            tenant.priority = INTERACTIVE
+            batch = self._queues[BATCH]
+            for ticket in [ticket for ticket in batch if ticket.tenant is tenant]:
+                batch.remove(ticket)
+                ticket.priority = INTERACTIVE
+                ticket.tag = self._next_tag(tenant)
+                heapq.heappush(self._queues[INTERACTIVE], ticket)
+            heapq.heapify(batch)
+            self._cond.notify_all()
+
+    def queue_depth(self):
+        with self._cond:
+            depth = {priority: len(queue) for priority, queue in self._queues.items()}
+            depth["sessions"] = len({
+                ticket.tenant.session_id for queue in self._queues.values() for ticket in queue
+            })
+        return depth
+
+    def _next_tag(self, tenant):
+        key = (tenant.priority, tenant.session_id)
+        tag = max(self._virtual_time[tenant.priority], self._last_tags.get(key, 0.0)) + 1.0 / tenant.weight
+        self._last_tags[key] = tag
+        return tag
+
+    def _enqueue(self, tenant):
+        ticket = _Ticket(self._next_tag(tenant), next(self._seq), tenant)
+        heapq.heappush(self._queues[ticket.priority], ticket)
+        return ticket
+
+    def _head(self):
+        interactive, batch = self._queues[INTERACTIVE], self._queues[BATCH]
+        if interactive and (not batch or self._batch_credit < 1.0):
+            return interactive[0]
+        if batch:
+            return batch[0]
+        return interactive[0] if interactive else None
+
+    def _dispatch(self, ticket, now):
+        heapq.heappop(self._queues[ticket.priority])
+        self._next_slot = max(now, self._next_slot) + self.interval
+        self._virtual_time[ticket.priority] = ticket.tag
+        if ticket.priority == BATCH:
+            self._batch_credit = max(0.0, self._batch_credit - 1.0)
+        elif self._queues[BATCH]:
+            self._batch_credit = min(1.0, self._batch_credit + self.batch_share)
+        if len(self._last_tags) > 1000:
+            # Tags at or below the virtual time carry no state; drop idle sessions.
+            self._last_tags = {
+                key: tag for key, tag in self._last_tags.items() if tag > self._virtual_time[key[0]]
+            }
+        metrics.increment(f"scheduler.{ticket.priority}.dispatched")
+        self._cond.notify_all()
+
+    def _remove(self, ticket):
+        queue = self._queues[ticket.priority]
+        queue.remove(ticket)
+        heapq.heapify(queue)
+        self._cond.notify_all()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler():
+    """Return the process-wide scheduler that fronts the provider quota for every session."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler(
+                calls=int(os.getenv("LLM_RATE_LIMIT_CALLS", "50")),
+                period=float(os.getenv("LLM_RATE_LIMIT_PERIOD", "60")),
+                batch_share=float(os.getenv("LLM_BATCH_SHARE", "0.1"))
+            )
+        return _scheduler
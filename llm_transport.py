@@ -0,0 +1,140 @@
+import asyncio
+import os
+import threading
+import weakref
+from loguru import logger
+from metrics import metrics
+
+# One keep-alive connection pool per process shared by every session thread
+# (sync client), and one per event loop for async calls, so TLS handshakes
+# and TCP setup are paid once rather than per ChatGroq instance. An async
+# pool's connections belong to the loop that opened them, so the single
+# AsyncClient handed to ChatGroq picks the running loop's pool per request.
+_lock = threading.Lock()
+_http_client = None
+_async_http_client = None
+
+
+def _http2_available():
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _pool_settings():
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_POOL_KEEPALIVE_EXPIRY", "60"))
+    )
+    http2 = os.getenv("LLM_HTTP2", "1") == "1" and _http2_available()
+    return limits, http2
+
+
+def _record_trace_event(event_name):
+    if event_name == "connection.connect_tcp.complete":
+        metrics.increment("llm.transport.connections_opened")
+    elif event_name == "connection.start_tls.complete":
+        metrics.increment("llm.transport.tls_handshakes")
+
+
+def _trace(event_name, info):
+    _record_trace_event(event_name)
+
+
+async def _atrace(event_name, info):
+    _record_trace_event(event_name)
+
+
+def _on_request(request):
+    metrics.increment("llm.transport.requests")
+    request.extensions["trace"] = _trace
+
+
+async def _on_request_async(request):
+    metrics.increment("llm.transport.requests")
+    request.extensions["trace"] = _atrace
+
+
+def get_http_client():
+    """Return the process-wide pooled httpx.Client."""
+    global _http_client
+    with _lock:
+        if _http_client is None:
+            import httpx
+
+            limits, http2 = _pool_settings()
+            _http_client = httpx.Client(
+                limits=limits,
+                http2=http2,
+                event_hooks={"request": [_on_request]}
+            )
+            logger.info(f"Created shared LLM HTTP pool (max {limits.max_connections} connections, http2={http2})")
+        return _http_client
+
+
+def _per_loop_transport(limits, http2):
+    import httpx
+
+    class PerLoopTransport(httpx.AsyncBaseTransport):
+        """Routes each request to a connection pool owned by the running event loop."""
+
+        def __init__(self):
+            self._transports = weakref.WeakKeyDictionary()
+            self._transports_lock = threading.Lock()
+
+        def _current(self):
+            loop = asyncio.get_running_loop()
+            with self._transports_lock:
+                transport = self._transports.get(loop)
+                if transport is None:
+                    transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+                    logger.debug(f"Created LLM HTTP pool for event loop {id(loop):#x}")
+                return transport
+
+        async def handle_async_request(self, request):
+            return await self._current().handle_async_request(request)
+
+        async def aclose(self):
+            # Connections can only be closed on their own loop; pools of
+            # other loops are dropped along with the loop.
+            loop = asyncio.get_running_loop()
+            with self._transports_lock:
+                transport = self._transports.pop(loop, None)
+            if transport is not None:
+                await transport.aclose()
+
+    return PerLoopTransport()
+
+
+def get_async_http_client():
+    """Return the process-wide httpx.AsyncClient, pooled per event loop."""
+    global _async_http_client
+    with _lock:
+        if _async_http_client is None:
+            import httpx
+
+            limits, http2 = _pool_settings()
+            _async_http_client = httpx.AsyncClient(
+                transport=_per_loop_transport(limits, http2),
+                event_hooks={"request": [_on_request_async]}
+            )
+        return _async_http_client
+
+
+def transport_stats():
+    """Connection-reuse figures for the shared pool."""
+    requests = metrics.count("llm.transport.requests")
+    opened = metrics.count("llm.transport.connections_opened")
+    reused = max(0, requests - opened)
+    return {
+        "requests": requests,
+        "connections_opened": opened,
+        "tls_handshakes": metrics.count("llm.transport.tls_handshakes"),
+        "reused_connections": reused,
+        "reuse_ratio": round(reused / requests, 3) if requests else None,
+    }
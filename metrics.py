@@ -0,0 +1,66 @@
+import threading
+from collections import defaultdict, deque
+
+
+def _pick(sorted_samples, pct):
+    index = int(round(pct / 100 * (len(sorted_samples) - 1)))
+    return sorted_samples[min(len(sorted_samples) - 1, max(0, index))]
+
+
+class Metrics:
+    """Thread-safe, in-process counters and timing samples.
+
+    Timings keep a bounded window of recent samples per name so percentiles
+    track current behaviour without growing without bound.
+    """
+
+    def __init__(self, max_samples=1000):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._timings = defaultdict(lambda: deque(maxlen=max_samples))
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name, value):
+        with self._lock:
+            self._timings[name].append(value)
+
+    def count(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def sample_count(self, name):
+        with self._lock:
+            return len(self._timings.get(name, ()))
+
+    def percentile(self, name, pct):
+        """Return the pct-th percentile (0-100) of recorded samples, or None."""
+        with self._lock:
+            samples = sorted(self._timings.get(name, ()))
+        if not samples:
+            return None
+        return _pick(samples, pct)
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self._counters)
+            timings = {name: sorted(values) for name, values in self._timings.items() if values}
+
+        return {
+            "counters": counters,
+            "timings": {
+                name: {
+                    "count": len(samples),
+                    "p50": round(_pick(samples, 50), 3),
+                    "p95": round(_pick(samples, 95), 3),
+                    "p99": round(_pick(samples, 99), 3),
+                }
+                for name, samples in timings.items()
+            },
+        }
+
+
+# Process-wide registry shared by all sessions.
+metrics = Metrics()
@@ -0,0 +1,101 @@
+import os
+
+# Per-stage model profiles. Heavy reasoning stages stay on the larger model;
+# lighter stages are routed to a smaller, faster model so they finish sooner
+# and draw from a separate quota pool. Every profile names a fallback model
+# that takes over when the primary is rate-limited or times out.
+#
+# ``timeout`` bounds a single HTTP request; ``deadline`` bounds the whole stage
+# completion, from queueing for quota through retried, fallback, hedged and
+# continuation requests. A stage that misses its deadline is not retried.
+# ``hedge_percentile`` enables hedging: once a call has run longer than that
+# percentile of the stage's recent latencies, a duplicate request is fired
+# and the first to finish wins.
+PRIMARY_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+FAST_MODEL = "llama-3.1-8b-instant"
+
+MODEL_PROFILES = {
+    "default": {
+        "model": PRIMARY_MODEL,
+        "fallback_model": FAST_MODEL,
+        "max_tokens": 3000,
+        "temperature": 0.7,
+        "timeout": 60.0,
+        "deadline": 120.0,
+        "hedge_percentile": None,
+    },
+    "requirements": {
+        "model": PRIMARY_MODEL,
+        "fallback_model": FAST_MODEL,
+        "max_tokens": 3000,
+        "temperature": 0.7,
+        "timeout": 60.0,
+        "deadline": 120.0,
+        "hedge_percentile": None,
+    },
+    "tech_specs": {
+        "model": PRIMARY_MODEL,
+        "fallback_model": FAST_MODEL,
+        "max_tokens": 3000,
+        "temperature": 0.7,
+        "timeout": 60.0,
+        "deadline": 120.0,
+        "hedge_percentile": None,
+    },
+    "architecture": {
+        "model": FAST_MODEL,
+        "fallback_model": PRIMARY_MODEL,
+        "max_tokens": 2000,
+        "temperature": 0.7,
+        "timeout": 30.0,
+        "deadline": 60.0,
+        "hedge_percentile": None,
+    },
+    "project_plan": {
+        "model": PRIMARY_MODEL,
+        "fallback_model": FAST_MODEL,
+        "max_tokens": 3000,
+        "temperature": 0.7,
+        "timeout": 60.0,
+        "deadline": 120.0,
+        "hedge_percentile": None,
+    },
+    "cost_estimate": {
+        "model": PRIMARY_MODEL,
+        "fallback_model": FAST_MODEL,
+        "max_tokens": 3000,
+        "temperature": 0.7,
+        "timeout": 60.0,
+        "deadline": 120.0,
+        "hedge_percentile": None,
+    },
+}
+
+
+def get_profile(stage="default"):
+    """Resolve the model profile for a stage, applying environment overrides.
+
+    Overrides use the stage name in upper case, e.g. ``GROQ_MODEL_ARCHITECTURE``,
+    ``GROQ_FALLBACK_MODEL_ARCHITECTURE``, ``GROQ_MAX_TOKENS_ARCHITECTURE``,
+    ``GROQ_TIMEOUT_ARCHITECTURE``, ``GROQ_DEADLINE_ARCHITECTURE`` and
+    ``GROQ_HEDGE_PERCENTILE_ARCHITECTURE``. ``GROQ_HEDGE_PERCENTILE`` enables
+    hedging for every stage that doesn't set its own.
+    """
+    profile = dict(MODEL_PROFILES.get(stage, MODEL_PROFILES["default"]))
+    suffix = stage.upper()
+    overrides = {
+        "model": (f"GROQ_MODEL_{suffix}", str),
+        "fallback_model": (f"GROQ_FALLBACK_MODEL_{suffix}", str),
+        "max_tokens": (f"GROQ_MAX_TOKENS_{suffix}", int),
+        "temperature": (f"GROQ_TEMPERATURE_{suffix}", float),
+        "timeout": (f"GROQ_TIMEOUT_{suffix}", float),
+        "deadline": (f"GROQ_DEADLINE_{suffix}", float),
+        "hedge_percentile": (f"GROQ_HEDGE_PERCENTILE_{suffix}", float),
+    }
+    if profile.get("hedge_percentile") is None and os.getenv("GROQ_HEDGE_PERCENTILE"):
+        profile["hedge_percentile"] = float(os.getenv("GROQ_HEDGE_PERCENTILE"))
+    for key, (env_var, cast) in overrides.items():
+        value = os.getenv(env_var)
+        if value:
+            profile[key] = cast(value)
+    return profile
@@ -0,0 +1,70 @@
+import math
+import threading
+from collections import defaultdict, deque
+from loguru import logger
+from model_profiles import get_profile
+
+# Budgets are only learned once a stage has this many recorded completions.
+MIN_SAMPLES = 10
+HEADROOM = 1.25
+MIN_OUTPUT_TOKENS = 512
+BUDGET_STEP = 256
+WINDOW = 200
+
+
+class OutputBudget:
+    """Per-stage max_tokens learned from historical completion lengths.
+
+    The budget is the 95th percentile of the stage's recent completion
+    lengths plus headroom, rounded up and clamped between MIN_OUTPUT_TOKENS
+    and the stage profile's max_tokens. Until enough history exists the
+    profile's max_tokens is used. Lengths are persisted in the history
+    database so budgets survive restarts.
+    """
+
+    def __init__(self, store=None):
+        self._store = store
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=WINDOW))
+        self._loaded = set()
+
+    def _get_store(self):
+        if self._store is None:
+            from history_store import get_history_store
+
+            self._store = get_history_store()
+        return self._store
+
+    def _ensure_loaded(self, stage):
+        if stage in self._loaded:
+            return
+        try:
+            lengths = self._get_store().recent_completion_lengths(stage, WINDOW)
+        except Exception as e:
+            logger.warning(f"Could not load completion history for '{stage}': {str(e)}")
+            lengths = []
+        self._samples[stage].extend(lengths)
+        self._loaded.add(stage)
+
+    def budget_for(self, stage):
+        ceiling = get_profile(stage)["max_tokens"]
+        with self._lock:
+            self._ensure_loaded(stage)
+            samples = sorted(self._samples[stage])
+        if len(samples) < MIN_SAMPLES:
+            return ceiling
+        p95 = samples[min(len(samples) - 1, int(math.ceil(0.95 * len(samples))) - 1)]
+        budget = int(math.ceil(p95 * HEADROOM / BUDGET_STEP) * BUDGET_STEP)
+        return max(MIN_OUTPUT_TOKENS, min(ceiling, budget))
+
+    def record(self, stage, tokens):
+        with self._lock:
+            self._ensure_loaded(stage)
+            self._samples[stage].append(tokens)
+        try:
+            self._get_store().record_completion_length(stage, tokens)
+        except Exception as e:
+            logger.warning(f"Could not persist completion length for '{stage}': {str(e)}")
+
+
+output_budget = OutputBudget()
@@ -0,0 +1,140 @@
+import time
+from loguru import logger
+from checkpoint_store import CheckpointStore, fingerprint
+from ai_analysis import REVISED_SECTIONS, strip_update_markers
+from revision import MAX_CHANGED_RATIO
+from estimation_index import index_version
+
+STAGES = ["requirements", "tech_specs", "architecture", "project_plan", "cost_estimate"]
+
+
+def _cost_inputs(cost_params):
+    # Team capacity only feeds the schedule, which is computed locally after
+    # the run, so changing it must not invalidate the billed cost stage.
+    # Runs limited to earlier stages (speculative pre-analysis) pass None.
+    return {key: value for key, value in (cost_params or {}).items() if key != "team_capacity"}
+
+
+class AnalysisRunner:
+    """Runs the analysis stages in order, checkpointing each as it completes.
+
+    Re-running with the same run ID resumes from the first stage without a
+    valid checkpoint, so finished stages are never billed twice. A failing
+    stage raises StageFailedError; everything before it stays checkpointed.
+    """
+
+    def __init__(self, ai_pipeline, project_planner, cost_estimator, store=None):
+        self.ai_pipeline = ai_pipeline
+        self.project_planner = project_planner
+        self.cost_estimator = cost_estimator
+        self.store = store or CheckpointStore()
+
+    def _stage_calls(self, content, cost_params, outputs):
+        return {
+            "requirements": (
+                (content,),
+                lambda: self.ai_pipeline.analyze_requirements(content),
+            ),
+            "tech_specs": (
+                (outputs.get("requirements"),),
+                lambda: self.ai_pipeline.generate_technical_specs(outputs["requirements"]),
+            ),
+            "architecture": (
+                (outputs.get("tech_specs"),),
+                lambda: self.ai_pipeline.suggest_architecture(outputs["tech_specs"]),
+            ),
+            # A rebuilt estimation index changes the calibration these
+            # stages are given, so it invalidates their checkpoints.
+            "project_plan": (
+                (outputs.get("tech_specs"), index_version()),
+                lambda: self.project_planner.generate_plan(outputs["tech_specs"]),
+            ),
+            "cost_estimate": (
+                (outputs.get("project_plan"), _cost_inputs(cost_params), index_version()),
+                lambda: self.cost_estimator.calculate_costs(outputs["project_plan"], cost_params),
+            ),
+        }
+
+    def _revision_calls(self, previous_outputs, changes, cost_params, outputs):
+        calls = {
+            stage: (
+                (previous_outputs.get(stage), changes),
+                # Nothing changed: keep the section without calling the model
+                lambda stage=stage: (
+                    self.ai_pipeline.revise_section(stage, previous_outputs[stage], changes)
+                    if changes else previous_outputs[stage]
+                ),
+            )
+            for stage in REVISED_SECTIONS
+        }
+        calls["cost_estimate"] = (
+            (outputs.get("project_plan"), _cost_inputs(cost_params), index_version()),
+            lambda: self.cost_estimator.calculate_costs(outputs["project_plan"], cost_params),
+        )
+        return calls
+
+    def run(self, content, cost_params, run_id=None, on_stage_complete=None, stages=None, on_stage_start=None):
+        """Run (or resume) the stages and return a dict of stage outputs.
+
+        stages limits the run to a prefix of STAGES (e.g. just requirements
+        for speculative pre-analysis). on_stage_start, if given, is called
+        with the stage name before each stage; on_stage_complete is called as
+        (stage, output, seconds, from_checkpoint) after it.
+        """
+        return self._run_stages(
+            run_id or fingerprint(content),
+            lambda outputs: self._stage_calls(content, cost_params, outputs),
+            stages or STAGES, on_stage_start, on_stage_complete
+        )
+
+    def run_revision(self, content, cost_params, previous_outputs, diff, run_id=None,
+                     on_stage_complete=None, on_stage_start=None):
+        """Update a previous run's outputs for a revised document.
+
+        Only the changed segments in diff are sent to the model, together
+        with each previous section, so the cost follows the size of the
+        edit rather than the document. An empty diff reuses the previous
+        sections as they are; a diff above MAX_CHANGED_RATIO falls back to
+        a full run of content. Markers from an earlier revision are removed
+        from the previous sections, so only this revision's edits are marked.
+        """
+        previous_outputs = {stage: strip_update_markers(output) for stage, output in previous_outputs.items()}
+        if any(not previous_outputs.get(stage) for stage in REVISED_SECTIONS):
+            logger.info("Previous run is incomplete; running a full analysis")
+            return self.run(content, cost_params, run_id, on_stage_complete, on_stage_start=on_stage_start)
+        if diff.changed_ratio > MAX_CHANGED_RATIO:
+            logger.info(f"Revision changes {diff.changed_ratio:.0%} of the document; running a full analysis")
+            return self.run(content, cost_params, run_id, on_stage_complete, on_stage_start=on_stage_start)
+
+        changes = diff.prompt_text()
+        return self._run_stages(
+            run_id or fingerprint(content, changes, *(previous_outputs[stage] for stage in REVISED_SECTIONS)),
+            lambda outputs: self._revision_calls(previous_outputs, changes, cost_params, outputs),
+            STAGES, on_stage_start, on_stage_complete
+        )
+
+    def _run_stages(self, run_id, calls_for, stages, on_stage_start, on_stage_complete):
+        outputs = {}
+
+        for stage in stages:
+            inputs, call = calls_for(outputs)[stage]
+            input_fingerprint = fingerprint(stage, *inputs)
+            start = time.monotonic()
+
+            if on_stage_start:
+                on_stage_start(stage)
+
+            with logger.contextualize(run_id=run_id[:12], stage=stage):
+                output = self.store.load(run_id, stage, input_fingerprint)
+                from_checkpoint = output is not None
+                if from_checkpoint:
+                    logger.info(f"Resuming run {run_id[:12]}: reusing checkpointed '{stage}'")
+                else:
+                    output = call()
+                    self.store.save(run_id, stage, input_fingerprint, output)
+
+            outputs[stage] = output
+            if on_stage_complete:
+                on_stage_complete(stage, output, time.monotonic() - start, from_checkpoint)
+
+        return outputs
@@ -1,6 +1,54 @@
-from langchain_core.prompts import PromptTemplate
-from langchain_classic.chains import LLMChain
 from loguru import logger
+from ai_analysis import StageFailedError
+from estimation_index import historical_estimates
+
+# Fixed instructions first, variable content last (see ai_analysis.py).
+PLAN_TEMPLATE = """Based on the technical specifications given at the end of this message, create a detailed project plan that includes clear phases, tasks, and resource allocation.
+
+Generate a comprehensive project plan with the following structure:
+
+1. Project Phases:
+   - Break down into logical phases
+   - Include duration estimates for each phase
+   - Specify key milestones and deliverables
+   - Note dependencies between phases
+
+2. Resource Requirements:
+   - Required team roles and expertise levels
+   - Development tools and licenses needed
+   - Infrastructure and cloud services required
+   - Testing and deployment resources
+
+3. Implementation Timeline:
+   - Major milestones and deadlines
+   - Buffer periods for risks
+
+4. Risk Assessment:
+   - Potential technical challenges
+   - Resource availability risks
+   - Timeline impact factors
+   - Mitigation strategies
+
+Include sufficient detail for accurate cost estimation, such as:
+- Time estimates for each phase and major task
+- Specific expertise levels required
+- Infrastructure components needed
+- Third-party tools and services
+- Complex integration points
+- Performance requirements
+- Security considerations
+
+Ground the hour estimates for each phase in the historical calibration below, which summarizes similar phases from projects we delivered. Stay within the typical range unless the specifications clearly justify more or less effort, and state the reason when you do.
+
+Do not calculate dates, durations, slack or the critical path yourself; they are computed from the phases. Instead, end your answer with a JSON code block (```json) listing the phases in this form:
+{{"phases": [{{"name": "Phase name", "estimated_hours": 120, "complexity_factor": 1.2, "role_distribution": {{"Senior Developer": 0.6, "Junior Developer": 0.4}}, "dependencies": ["Names of phases that must finish first"], "deliverables": ["Deliverable"], "tasks": [{{"name": "Task name", "estimated_hours": 40, "role": "Senior Developer", "dependencies": ["Names of tasks in this phase that must finish first"]}}]}}]}}
+Use only these roles: Junior Developer, Senior Developer, Project Manager, Designer.
+
+Historical Calibration:
+{historical_estimates}
+
+Technical Specifications:
+{tech_specs}"""
 
 class ProjectPlanner:
     def __init__(self, groq_client):
@@ -8,52 +56,16 @@ class ProjectPlanner:
         self._setup_chain()
         
     def _setup_chain(self):
-        plan_template = """Based on the technical specifications provided, create a detailed project plan that includes clear phases, tasks, and resource allocation.
-
-        Technical Specifications:
-        {tech_specs}
-        
-        Generate a comprehensive project plan with the following structure:
-        
-        1. Project Phases:
-           - Break down into logical phases
-           - Include duration estimates for each phase
-           - Specify key milestones and deliverables
-           - Note dependencies between phases
-           
-        2. Resource Requirements:
-           - Required team roles and expertise levels
-           - Development tools and licenses needed
-           - Infrastructure and cloud services required
-           - Testing and deployment resources
-           
-        3. Implementation Timeline:
-           - Start and end dates for each phase
-           - Major milestones and deadlines
-           - Critical path activities
-           - Buffer periods for risks
-           
-        4. Risk Assessment:
-           - Potential technical challenges
-           - Resource availability risks
-           - Timeline impact factors
-           - Mitigation strategies
-           
-        Include sufficient detail for accurate cost estimation, such as:
-        - Time estimates for each phase and major task
-        - Specific expertise levels required
-        - Infrastructure components needed
-        - Third-party tools and services
-        - Complex integration points
-        - Performance requirements
-        - Security considerations"""
-        
-        self.plan_chain = self.groq_client.create_chain(plan_template)
+        # Shared, precompiled chain from the process-wide registry
+        self.plan_chain = self.groq_client.create_chain(PLAN_TEMPLATE, stage="project_plan")
     
     def generate_plan(self, tech_specs):
         """Generate a detailed project plan from technical specifications."""
         try:
-            return self.plan_chain.run(tech_specs=tech_specs)
+            return self.groq_client.run_chain(
+                self.plan_chain, "project_plan",
+                historical_estimates=historical_estimates(tech_specs), tech_specs=tech_specs
+            )
         except Exception as e:
             logger.error(f"Error generating project plan: {str(e)}")
-            return "Error generating project plan. Please check the inputs and try again."
\ No newline at end of file
+            raise StageFailedError("project_plan", e) from e
\ No newline at end of file
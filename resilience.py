@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+from loguru import logger
+
+from metrics import metrics
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while its circuit is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class RequestNotSentError(Exception):
+    """Base for failures before a request reached the provider, such as a
+    timeout waiting for quota. They say nothing about the provider's health,
+    so they are neither retried nor counted by circuit breakers."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when a call runs out its overall deadline.
+
+    Not retried, since the time a retry would need is already spent, but
+    still counted as a provider failure by circuit breakers.
+    """
+
+
+def _status_code(exc):
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """Classify an exception as transient (worth retrying) or permanent."""
+    if isinstance(exc, (CircuitOpenError, RequestNotSentError, DeadlineExceededError)):
+        return False
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    # SDK transport errors (groq.APIConnectionError, groq.APITimeoutError,
+    # httpx.TransportError) carry no status code.
+    name = type(exc).__name__
+    return any(marker in name for marker in ("Timeout", "Connection", "Transport"))
+
+
+def get_retry_after(exc):
+    """Return the server's Retry-After hint in seconds, if the error has one."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryBudget:
+    """Caps retries to a fraction of recent calls across the whole process.
+
+    Within the sliding window, retries may not exceed ``ratio`` of first
+    attempts (with a small floor so a quiet process can still retry). When
+    the provider degrades, this stops every session from multiplying load.
+    """
+
+    def __init__(self, ratio=0.2, min_retries=3, window=60.0):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = deque()
+        self._retries = deque()
+
+    def _trim(self, now):
+        cutoff = now - self.window
+        for events in (self._calls, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_acquire(self):
+        """Reserve a retry if the budget allows it."""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = max(self.min_retries, int(len(self._calls) * self.ratio))
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    """Fails fast while a dependency is down, probing it to recover.
+
+    Closed: calls pass through and consecutive retryable failures (and
+    missed deadlines) are counted.
+    Open: after ``failure_threshold`` failures, calls raise CircuitOpenError
+    for ``recovery_timeout`` seconds. Half-open: one probe call is let through;
+    success closes the circuit, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def before_call(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if self._state == self.OPEN and elapsed >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                logger.info(f"Circuit '{self.name}' half-open, sending probe")
+                return
+            metrics.increment(f"circuit.{self.name}.rejected")
+            raise CircuitOpenError(self.name, max(0.0, self.recovery_timeout - elapsed))
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, exc):
+        if isinstance(exc, RequestNotSentError):
+            # Nothing reached the provider; just free the probe slot if
+            # this call held it.
+            with self._lock:
+                self._probe_in_flight = False
+            return
+        if not is_retryable(exc) and not isinstance(exc, DeadlineExceededError):
+            # A client error (bad request, auth) means the provider answered,
+            # so it counts as a healthy response.
+            self.record_success()
+            return
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    metrics.increment(f"circuit.{self.name}.opened")
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+# Shared across all sessions in the process.
+retry_budget = RetryBudget()
@@ -0,0 +1,73 @@
+import difflib
+import os
+import re
+
+# Extraction collapses whitespace inside each source apart from the line
+# breaks between DOCX blocks, so the units compared are lines (source
+# sections, paragraphs, headings, table rows) split into sentences.
+_SEGMENT_BREAK = re.compile(r'\s*\n\s*|(?<=[.!?])\s+')
+
+# Above this share of changed text, a revision costs about as much as a
+# fresh analysis and is more likely to drift, so the full pipeline runs.
+MAX_CHANGED_RATIO = float(os.getenv("REVISION_MAX_CHANGED_RATIO", "0.5"))
+
+
+def split_segments(text):
+    """Split extracted text into whitespace-normalised sentence segments."""
+    return [" ".join(part.split()) for part in _SEGMENT_BREAK.split(text or "") if part.strip()]
+
+
+class DocumentDiff:
+    """Segment-level alignment of a revised document against a previous version.
+
+    Each change is a dict with a kind ('added', 'removed' or 'changed'), the
+    old and new text of the affected segments, and the unchanged segment
+    just before it in the new version, so the model can place it.
+    """
+
+    def __init__(self, old_text, new_text):
+        old = split_segments(old_text)
+        new = split_segments(new_text)
+        matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+        self.changes = []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            self.changes.append({
+                "kind": {"insert": "added", "delete": "removed", "replace": "changed"}[tag],
+                "old": " ".join(old[i1:i2]),
+                "new": " ".join(new[j1:j2]),
+                "after": new[j1 - 1] if j1 > 0 else "",
+            })
+        total = sum(len(segment) for segment in old) + sum(len(segment) for segment in new)
+        changed = sum(len(change["old"]) + len(change["new"]) for change in self.changes)
+        self.changed_ratio = changed / total if total else 0.0
+
+    def __bool__(self):
+        return bool(self.changes)
+
+    def prompt_text(self):
+        """Render the changes for a revision prompt; unchanged text is left out."""
+        lines = []
+        for number, change in enumerate(self.changes, 1):
+            lines.append(f"Change {number} ({change['kind']}):")
+            if change["after"]:
+                lines.append(f"  After: {change['after']}")
+            if change["old"]:
+                lines.append(f"  Previous text: {change['old']}")
+            if change["new"]:
+                lines.append(f"  Revised text: {change['new']}")
+        return "\n".join(lines)
+
+
+def changes_markdown(changes):
+    """Render a list of changes as Markdown with added and removed text highlighted."""
+    lines = []
+    for change in changes:
+        if change["kind"] == "added":
+            lines.append(f"- ➕ :green[{change['new']}]")
+        elif change["kind"] == "removed":
+            lines.append(f"- ➖ :red[~~{change['old']}~~]")
+        else:
+            lines.append(f"- ✏️ :red[~~{change['old']}~~] → :green[{change['new']}]")
+    return "\n".join(lines)
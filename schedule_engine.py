@@ -0,0 +1,284 @@
+import heapq
+import json
+import re
+
+HOURS_PER_DAY = 8
+EPSILON = 1e-6
+UNASSIGNED = "Unassigned"
+
+_PHASES_BLOCK = re.compile(r"```json\s*(.*?)```", re.DOTALL)
+
+
+class ScheduleError(ValueError):
+    """Raised when the phases can't be scheduled, e.g. their dependencies form a cycle."""
+
+
+def extract_phases(plan_text):
+    """Return the phases from the plan's JSON block, or None if it has none that parses."""
+    for block in reversed(_PHASES_BLOCK.findall(plan_text or "")):
+        try:
+            data = json.loads(block)
+        except ValueError:
+            continue
+        phases = data.get("phases") if isinstance(data, dict) else data
+        if isinstance(phases, list) and all(isinstance(phase, dict) and phase.get("name") for phase in phases):
+            return phases
+    return None
+
+
+def strip_phases_block(plan_text):
+    """The plan text without its JSON phases block, for display."""
+    return _PHASES_BLOCK.sub("", plan_text or "").rstrip()
+
+
+def as_number(value):
+    """A model-supplied hours or share value as a non-negative float.
+
+    Accepts numbers and numeric strings such as "120" or "60%" (read as 60,
+    since shares are only used relative to each other); anything else is 0.
+    """
+    if isinstance(value, str):
+        value = value.strip().rstrip("%")
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class _Graph:
+    def __init__(self):
+        self.activities = []
+        self.successors = []
+        self.predecessors = []
+
+    def add(self, **activity):
+        activity["id"] = len(self.activities)
+        activity.setdefault("hours", 0.0)
+        activity["duration_days"] = activity["hours"] / HOURS_PER_DAY
+        self.activities.append(activity)
+        self.successors.append([])
+        self.predecessors.append([])
+        return activity["id"]
+
+    def link(self, before, after):
+        self.successors[before].append(after)
+        self.predecessors[after].append(before)
+
+
+def _build_graph(phases):
+    """Activities and precedence edges for the phases.
+
+    Each phase gets zero-length start and end milestones, so a phase
+    dependency is a single edge between milestones rather than an edge per
+    pair of tasks. A phase without tasks becomes one activity per role in
+    its role distribution, worked in parallel.
+    """
+    graph = _Graph()
+    warnings = []
+    milestones = {}
+    task_ids = {}
+    pending = []
+
+    for phase in phases:
+        name = str(phase["name"])
+        if name in milestones:
+            warnings.append(f"Duplicate phase '{name}' ignored; only the first one is scheduled")
+            continue
+        start = graph.add(phase=name, name=f"{name} start", role=None, milestone=True)
+        end = graph.add(phase=name, name=f"{name} end", role=None, milestone=True)
+        milestones[name] = (start, end)
+
+        roles = {str(role): as_number(share) for role, share in (phase.get("role_distribution") or {}).items()}
+        roles = {role: share for role, share in roles.items() if share} or {UNASSIGNED: 1.0}
+        lead_role = max(roles, key=roles.get)
+        phase_hours = as_number(phase.get("estimated_hours"))
+        tasks = [task if isinstance(task, dict) else {"name": str(task)} for task in phase.get("tasks") or []]
+
+        if tasks:
+            given = sum(as_number(task.get("estimated_hours")) for task in tasks)
+            missing = sum(1 for task in tasks if not as_number(task.get("estimated_hours")))
+            default_hours = max(0.0, phase_hours - given) / missing if missing else 0.0
+            for task in tasks:
+                task_name = str(task.get("name", ""))
+                task_id = graph.add(
+                    phase=name, name=task_name, role=str(task.get("role") or lead_role),
+                    hours=as_number(task.get("estimated_hours")) or default_hours, milestone=False
+                )
+                task_ids.setdefault((name, task_name), task_id)
+                task_ids.setdefault((None, task_name), task_id)
+                graph.link(task_id, end)
+                pending.append((name, task_id, task.get("dependencies") or []))
+        else:
+            total = sum(roles.values())
+            for role, share in roles.items():
+                activity = graph.add(phase=name, name=f"{name} ({role})", role=role,
+                                     hours=phase_hours * share / total, milestone=False)
+                graph.link(start, activity)
+                graph.link(activity, end)
+
+        pending.append((name, None, phase.get("dependencies") or []))
+
+    for phase_name, task_id, dependencies in pending:
+        start, _ = milestones[phase_name]
+        if task_id is not None and not dependencies:
+            graph.link(start, task_id)
+        for dependency in dependencies:
+            dependency = str(dependency)
+            if task_id is not None and (phase_name, dependency) in task_ids:
+                graph.link(task_ids[(phase_name, dependency)], task_id)
+            elif task_id is not None and (None, dependency) in task_ids:
+                graph.link(task_ids[(None, dependency)], task_id)
+                graph.link(start, task_id)
+            elif dependency == phase_name:
+                # A phase can't wait for its own end, which waits for its tasks.
+                if task_id is None:
+                    warnings.append(f"'{phase_name}' depends on itself, ignored")
+                else:
+                    task_name = graph.activities[task_id]["name"]
+                    warnings.append(f"'{task_name}' in '{phase_name}' depends on its own phase, ignored")
+                    graph.link(start, task_id)
+            elif dependency in milestones:
+                graph.link(milestones[dependency][1], start if task_id is None else task_id)
+                if task_id is not None:
+                    graph.link(start, task_id)
+            else:
+                warnings.append(f"'{phase_name}' depends on unknown '{dependency}', ignored")
+                if task_id is not None:
+                    graph.link(start, task_id)
+    return graph, milestones, warnings
+
+
+def _topological_order(graph):
+    """Kahn's algorithm; raises ScheduleError naming a cycle if there is one."""
+    indegree = [len(predecessors) for predecessors in graph.predecessors]
+    queue = [node for node, degree in enumerate(indegree) if degree == 0]
+    order = []
+    while queue:
+        node = queue.pop()
+        order.append(node)
+        for successor in graph.successors[node]:
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                queue.append(successor)
+    if len(order) < len(graph.activities):
+        raise ScheduleError(f"Dependency cycle: {' -> '.join(_find_cycle(graph, indegree))}")
+    return order
+
+
+def _find_cycle(graph, indegree):
+    # Every node left with a positive in-degree has a predecessor that is
+    # also left, so walking predecessors must revisit a node.
+    node = next(node for node, degree in enumerate(indegree) if degree > 0)
+    seen = {}
+    path = []
+    while node not in seen:
+        seen[node] = len(path)
+        path.append(node)
+        node = next(p for p in graph.predecessors[node] if indegree[p] > 0)
+    cycle = path[seen[node]:][::-1]
+    return [graph.activities[n]["name"] for n in cycle + cycle[:1]]
+
+
+def build_schedule(phases, role_capacity=None):
+    """Critical-path schedule of the phases, levelled against role capacity.
+
+    Returns a dict with per-activity and per-phase earliest/latest start and
+    finish (in working days from project start), slack, the critical path,
+    and levelled start/finish when each role only has role_capacity people
+    (default 1). The CPM passes are linear in activities plus dependencies;
+    levelling adds a log factor for its priority queue.
+    """
+    graph, milestones, warnings = _build_graph(phases)
+    order = _topological_order(graph)
+    activities = graph.activities
+
+    for node in order:
+        activity = activities[node]
+        activity["earliest_start"] = max(
+            (activities[p]["earliest_finish"] for p in graph.predecessors[node]), default=0.0
+        )
+        activity["earliest_finish"] = activity["earliest_start"] + activity["duration_days"]
+    duration = max((activity["earliest_finish"] for activity in activities), default=0.0)
+
+    for node in reversed(order):
+        activity = activities[node]
+        activity["latest_finish"] = min(
+            (activities[s]["latest_start"] for s in graph.successors[node]), default=duration
+        )
+        activity["latest_start"] = activity["latest_finish"] - activity["duration_days"]
+        activity["slack"] = max(0.0, activity["latest_start"] - activity["earliest_start"])
+        activity["critical"] = activity["slack"] <= EPSILON
+
+    leveled_duration = _level(graph, role_capacity or {})
+
+    return {
+        "duration_days": duration,
+        "leveled_duration_days": leveled_duration,
+        "activities": [activity for activity in activities if not activity["milestone"]],
+        "phases": [_phase_summary(name, graph, start, end) for name, (start, end) in milestones.items()],
+        "critical_path": _critical_path(graph, order),
+        "warnings": warnings,
+    }
+
+
+def _critical_path(graph, order):
+    activities = graph.activities
+    node = next((n for n in order if activities[n]["critical"] and not graph.predecessors[n]), None)
+    path = []
+    while node is not None:
+        if not activities[node]["milestone"]:
+            path.append(activities[node]["name"])
+        finish = activities[node]["earliest_finish"]
+        node = next(
+            (s for s in graph.successors[node]
+             if activities[s]["critical"] and abs(activities[s]["earliest_start"] - finish) <= EPSILON),
+            None
+        )
+    return path
+
+
+def _level(graph, role_capacity):
+    """Greedy serial levelling: ready activities by least latest start, each
+    on the role member who frees up first. Returns the levelled duration."""
+    activities = graph.activities
+    capacity = {str(role).lower(): max(1, int(count)) for role, count in role_capacity.items()}
+    workers = {}
+    indegree = [len(predecessors) for predecessors in graph.predecessors]
+    ready_at = [0.0] * len(activities)
+    ready = [(activities[n]["latest_start"], n) for n, degree in enumerate(indegree) if degree == 0]
+    heapq.heapify(ready)
+    finish = 0.0
+
+    while ready:
+        _, node = heapq.heappop(ready)
+        activity = activities[node]
+        start = ready_at[node]
+        if not activity["milestone"] and activity["duration_days"] > 0:
+            role = activity["role"].lower()
+            pool = workers.setdefault(role, [0.0] * capacity.get(role, 1))
+            start = max(start, heapq.heappop(pool))
+            heapq.heappush(pool, start + activity["duration_days"])
+        activity["leveled_start"] = start
+        activity["leveled_finish"] = start + activity["duration_days"]
+        finish = max(finish, activity["leveled_finish"])
+        for successor in graph.successors[node]:
+            ready_at[successor] = max(ready_at[successor], activity["leveled_finish"])
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                heapq.heappush(ready, (activities[successor]["latest_start"], successor))
+    return finish
+
+
+def _phase_summary(name, graph, start, end):
+    first, last = graph.activities[start], graph.activities[end]
+    return {
+        "name": name,
+        "earliest_start": first["earliest_start"],
+        "earliest_finish": last["earliest_finish"],
+        "latest_finish": last["latest_finish"],
+        "slack": last["slack"],
+        "critical": last["critical"],
+        "leveled_start": first["leveled_start"],
+        "leveled_finish": last["leveled_finish"],
+    }
+
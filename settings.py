@@ -1,10 +1,130 @@
+import atexit
+import glob
+import json
 import os
-from dotenv import load_dotenv
+import queue
+import random
+import threading
+import time
+import traceback
 from loguru import logger
 import sys
 
+
+class _QueuedFileSink:
+    """Loguru sink that hands raw records to a writer thread.
+
+    The calling thread only puts the record on a queue; formatting (or JSON
+    serialisation) and the file write happen on the writer thread. The file
+    is rotated once it reaches rotation_bytes, and rotated files older than
+    retention_days are deleted.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path, serialize=False, rotation_bytes=500 * 1000 * 1000, retention_days=10):
+        self.path = path
+        self.serialize = serialize
+        self.rotation_bytes = rotation_bytes
+        self.retention_seconds = retention_days * 86400
+        self._queue = queue.Queue()
+        self._file = None
+        self._second = None
+        self._second_text = ""
+        self._thread = threading.Thread(target=self._write_loop, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message):
+        self._queue.put(message.record)
+
+    def stop(self):
+        """Write everything queued so far and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _write_loop(self):
+        while True:
+            record = self._queue.get()
+            if record is self._STOP:
+                break
+            try:
+                self._write(record)
+                if self._queue.empty():
+                    self._file.flush()
+            except OSError as e:
+                sys.stderr.write(f"Log writer could not write to {self.path}: {e}\n")
+        if self._file is not None:
+            self._file.close()
+
+    def _write(self, record):
+        line = self._serialize(record) if self.serialize else self._format(record)
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        elif self._file.tell() + len(line) > self.rotation_bytes:
+            self._rotate()
+        self._file.write(line)
+
+    def _rotate(self):
+        self._file.close()
+        root, ext = os.path.splitext(self.path)
+        os.replace(self.path, f"{root}.{time.strftime('%Y-%m-%d_%H-%M-%S')}{ext}")
+        cutoff = time.time() - self.retention_seconds
+        for rotated in glob.glob(f"{glob.escape(root)}.*{ext}"):
+            if os.path.getmtime(rotated) < cutoff:
+                os.remove(rotated)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _format(self, record):
+        moment = record["time"]
+        second = int(moment.timestamp())
+        if second != self._second:
+            # strftime is the slowest part of a line; it only changes once a second.
+            self._second, self._second_text = second, moment.strftime("%Y-%m-%d %H:%M:%S")
+        line = (f"{self._second_text}.{moment.microsecond // 1000:03d} | "
+                f"{record['level'].name: <8} | {record['name']}:{record['function']}:{record['line']} - "
+                f"{record['message']}\n")
+        return line + (self._traceback(record) or "")
+
+    @staticmethod
+    def _traceback(record):
+        exception = record["exception"]
+        if exception is None:
+            return None
+        return "".join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+
+    @classmethod
+    def _serialize(cls, record):
+        return json.dumps({
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "name": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "message": record["message"],
+            "extra": record["extra"],
+            "exception": cls._traceback(record),
+        }, default=str) + "\n"
+
+
 class Config:    
+    """Logging configuration, driven by environment variables.
+
+    LOG_MODE selects the file sink: "text" writes synchronously to
+    logs/app.log, "async" does the same through an in-process queue drained
+    by a writer thread, and "json" writes JSON lines to logs/app.jsonl
+    through the queue, with the run and stage IDs bound via
+    logger.contextualize in each record's extra.
+
+    LOG_PAYLOAD_SAMPLE_RATE (0-1) controls how many prompt/response payloads
+    are logged at all, and LOG_PAYLOAD_MAX_CHARS caps their size.
+    """
+
     def __init__(self):
+        self.log_mode = os.getenv("LOG_MODE", "text").lower()
+        self.payload_sample_rate = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.05"))
+        self.payload_max_chars = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "200"))
         self._setup_logging()
  
     def _setup_logging(self):
@@ -14,12 +134,41 @@ class Config:
             format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <white>{message}</white>",
             level="INFO"
         )
-        logger.add(
-            "logs/app.log",
-            rotation="500 MB",
-            retention="10 days",
-            level="DEBUG"
-        )
+        if self.log_mode in ("async", "json"):
+            # loguru's enqueue=True formats and pickles every record on the
+            # calling thread; this sink only queues it (see _QueuedFileSink).
+            json_mode = self.log_mode == "json"
+            sink = _QueuedFileSink("logs/app.jsonl" if json_mode else "logs/app.log", serialize=json_mode)
+            atexit.register(sink.stop)
+            logger.add(sink, format="{message}", level="DEBUG")
+        else:
+            logger.add(
+                "logs/app.log",
+                rotation="500 MB",
+                retention="10 days",
+                level="DEBUG"
+            )
+
+    def loggable_payload(self, text):
+        """Return a size-capped copy of a prompt/response if it is sampled, else None."""
+        if self.payload_sample_rate <= 0 or random.random() >= self.payload_sample_rate:
+            return None
+        text = str(text)
+        if len(text) > self.payload_max_chars:
+            return f"{text[:self.payload_max_chars]}... [{len(text) - self.payload_max_chars} chars truncated]"
+        return text
+
+
+_config = None
+_config_lock = threading.Lock()
+
+def get_config():
+    """Return the process-wide Config, setting up logging on first use."""
+    global _config
+    with _config_lock:
+        if _config is None:
+            from dotenv import load_dotenv
 
-            
-    
+            load_dotenv()
+            _config = Config()
+        return _config
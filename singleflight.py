@@ -0,0 +1,129 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from contextlib import contextmanager
+from loguru import logger
+from metrics import metrics
+
+# Coalesced calls run here rather than on any one caller's thread, so the
+# work outlives a caller that gives up while others still wait on it.
+_flight_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="single-flight")
+
+# How often a waiter with a detach event checks it.
+DETACH_POLL_INTERVAL = 0.2
+
+_detach_event = contextvars.ContextVar("singleflight_detach", default=None)
+
+
+class WaitTimeoutError(TimeoutError):
+    """Raised to a caller that gave up waiting on a call still in flight."""
+
+
+@contextmanager
+def detach_on(event):
+    """Calls made inside the block stop waiting, raising CancelledError, once event is set."""
+    token = _detach_event.set(event)
+    try:
+        yield
+    finally:
+        _detach_event.reset(token)
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+        self.future = None
+        self.context = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work; callers arriving while it
+    is still running attach to it and receive the same result or exception.
+    Finished results are not kept, so a later call starts fresh. A caller
+    that times out, is interrupted or is cancelled through detach_on()
+    detaches; when the last one leaves,
+    the work is cancelled through the event passed to it, which it checks
+    between steps.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func, timeout=None, on_join=None):
+        """Return func(cancelled) for key, sharing any call already in flight.
+
+        Raises WaitTimeoutError after timeout seconds. on_join, if given, is
+        called with the flight's context when this call attaches to one
+        started by another caller.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            joined = flight is not None
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                # The work runs in a copy of the first caller's context, so
+                # its logs and quota are attributed to that caller.
+                flight.context = contextvars.copy_context()
+                flight.future = _flight_executor.submit(flight.context.run, self._run, key, flight, func)
+                metrics.increment(f"singleflight.{self.name}.started")
+            else:
+                metrics.increment(f"singleflight.{self.name}.coalesced")
+            flight.waiters += 1
+
+        try:
+            if joined and on_join is not None:
+                on_join(flight.context)
+            self._wait(flight, timeout)
+        finally:
+            self._leave(key, flight)
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def _wait(self, flight, timeout):
+        detach = _detach_event.get()
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        while not flight.done.is_set():
+            if detach is not None and detach.is_set():
+                raise CancelledError(f"Stopped waiting on in-flight {self.name} call")
+            wait = None if give_up_at is None else give_up_at - time.monotonic()
+            if wait is not None and wait <= 0:
+                raise WaitTimeoutError(f"Timed out waiting for in-flight {self.name} call")
+            if detach is not None:
+                wait = DETACH_POLL_INTERVAL if wait is None else min(wait, DETACH_POLL_INTERVAL)
+            flight.done.wait(wait)
+
+    def _run(self, key, flight, func):
+        try:
+            flight.result = func(flight.cancelled)
+        except BaseException as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+
+    def _leave(self, key, flight):
+        with self._lock:
+            flight.waiters -= 1
+            if flight.waiters or flight.done.is_set():
+                return
+            # Nobody is waiting any more: stop new callers from joining and
+            # stop the work at its next step.
+            flight.cancelled.set()
+            flight.future.cancel()
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        metrics.increment(f"singleflight.{self.name}.cancelled")
+        logger.info(f"Cancelled in-flight {self.name} call after its last waiter left")
@@ -0,0 +1,73 @@
+import io
+import os
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from loguru import logger
+from metrics import metrics
+from ai_analysis import StageFailedError
+from llm_scheduler import BATCH, Tenant, current_tenant, get_llm_scheduler, use_tenant
+from singleflight import detach_on
+
+# Background pool for work started before the user asks for it.
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+
+
+def speculation_enabled():
+    return os.getenv("SPECULATIVE_ANALYSIS", "1") == "1"
+
+
+class _UploadedBytes(io.BytesIO):
+    """In-memory copy of an upload, detached from the Streamlit widget."""
+
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+
+
+class SpeculativeAnalysis:
+    """Extraction and requirements analysis started as soon as files are uploaded.
+
+    Neither step depends on the sidebar cost settings, so both can overlap
+    with the time the user spends configuring them. The requirements output
+    is written to the checkpoint store under the document hash, where the
+    real run picks it up. Cancelling stops the work at the next step
+    boundary and stops waiting on any LLM completion in flight, which is
+    itself cancelled unless another caller shares it.
+    """
+
+    def __init__(self, document_hash, files, doc_processor, runner):
+        self.document_hash = document_hash
+        self.file_name = ", ".join(name for name, _ in files)
+        self._cancelled = threading.Event()
+        # Nobody is waiting on this yet, so its LLM calls queue as batch work
+        # for the uploading session until result() is called.
+        self._tenant = Tenant(current_tenant().session_id, BATCH)
+        self._future = _executor.submit(
+            self._run, [_UploadedBytes(data, name) for name, data in files], doc_processor, runner
+        )
+        metrics.increment("speculative.started")
+        logger.info(f"Started speculative analysis of {self.file_name}")
+
+    def _run(self, files, doc_processor, runner):
+        content = doc_processor.process_documents(files)
+        if self._cancelled.is_set():
+            return content
+        try:
+            with use_tenant(self._tenant), detach_on(self._cancelled):
+                runner.run(content, None, run_id=self.document_hash, stages=["requirements"])
+        except (StageFailedError, CancelledError) as e:
+            # The real run retries the stage; only extraction must succeed here.
+            logger.warning(f"Speculative requirements analysis failed: {str(e)}")
+        return content
+
+    def cancel(self):
+        self._cancelled.set()
+        if self._future.cancel() or not self._future.done():
+            metrics.increment("speculative.cancelled")
+            logger.info(f"Cancelled speculative analysis of {self.file_name}")
+
+    def result(self, timeout=None):
+        """Wait for the extraction (and requirements checkpoint) and return the text."""
+        metrics.increment("speculative.claimed")
+        get_llm_scheduler().promote(self._tenant)
+        return self._future.result(timeout=timeout)
@@ -0,0 +1,39 @@
+"""Stand-ins for the LLM-backed pipeline steps, recording what they were asked to do."""
+
+
+class FakePipeline:
+    def __init__(self, error=None):
+        self.calls = []
+        self.error = error
+
+    def analyze_requirements(self, content):
+        self.calls.append("requirements")
+        if self.error is not None:
+            raise self.error
+        return f"requirements of {content}"
+
+    def generate_technical_specs(self, requirements):
+        self.calls.append("tech_specs")
+        return f"specs from {requirements}"
+
+    def suggest_architecture(self, tech_specs):
+        self.calls.append("architecture")
+        return f"architecture for {tech_specs}"
+
+    def revise_section(self, stage, previous, changes):
+        self.calls.append(("revise", stage, previous))
+        return f"[UPDATED] {previous}"
+
+
+class FakePlanner:
+    def generate_plan(self, tech_specs):
+        return {"work_breakdown": {"phases": []}}
+
+
+class FakeEstimator:
+    def __init__(self):
+        self.calls = 0
+
+    def calculate_costs(self, project_plan, cost_params):
+        self.calls += 1
+        return {"status": "success"}
@@ -0,0 +1,44 @@
+import io
+
+from document_processor import CHARS_PER_TOKEN, DocumentProcessor, _BoundedText
+
+
+def upload(data, name="upload.txt"):
+    file = io.BytesIO(data)
+    file.name = name
+    return file
+
+
+def test_txt_without_whitespace_is_cut_to_the_budget():
+    processor = DocumentProcessor(max_tokens=100)
+    data = b'{"id":1,"sku":"A-17"},' * 200_000
+
+    text = processor._process_txt(upload(data))
+
+    assert len(text) == 100 * CHARS_PER_TOKEN
+    assert data.decode().startswith(text)
+
+
+def test_txt_decodes_multibyte_and_invalid_utf8_across_blocks():
+    processor = DocumentProcessor(max_tokens=20_000)
+    # The first 64 KiB block ends between the two bytes of "ç".
+    data = ("x" * 65532 + " façade").encode("utf-8") + b" bad\xff byte"
+
+    text = processor._process_txt(upload(data))
+
+    assert text.endswith("façade bad� byte")
+
+
+def test_file_of_exactly_max_bytes_is_not_truncated():
+    processor = DocumentProcessor(max_bytes=11, max_tokens=100)
+
+    assert processor._process_txt(upload(b"hello world")) == "hello world"
+    assert processor._process_txt(upload(b"hello world again")) == "hello world"
+
+
+def test_bounded_text_keeps_block_line_breaks():
+    buffer = _BoundedText(100)
+    buffer.add_text("# Scope", separator="\n")
+    buffer.add_text("The portal  shall\ttrack orders.", separator="\n")
+
+    assert buffer.text() == "# Scope\nThe portal shall track orders."
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import BATCH, PRIORITIES, FairScheduler, QueueTimeoutError, Tenant, use_tenant
+
+
+def blocked_scheduler(batch_share=0.1):
+    """A scheduler whose next slot is 0.3s away, releasing a call every 10ms after that."""
+    scheduler = FairScheduler(calls=1, period=0.3, batch_share=batch_share)
+    scheduler.acquire()
+    scheduler.interval = 0.01
+    return scheduler
+
+
+def queue_calls(scheduler, tenants):
+    """Queue one call per tenant, in order, and return the threads and dispatch order."""
+    order = []
+    threads = []
+    for tenant in tenants:
+        def call(tenant=tenant):
+            with use_tenant(tenant):
+                scheduler.acquire(timeout=10)
+            order.append(tenant.session_id)
+
+        thread = threading.Thread(target=call)
+        thread.start()
+        threads.append(thread)
+        while sum(scheduler.queue_depth()[priority] for priority in PRIORITIES) < len(threads):
+            time.sleep(0.001)
+    return threads, order
+
+
+def test_sessions_take_turns_within_a_class():
+    scheduler = blocked_scheduler()
+    heavy, light = Tenant("heavy"), Tenant("light")
+
+    threads, order = queue_calls(scheduler, [heavy] * 4 + [light] * 2)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["heavy", "light", "heavy", "light", "heavy", "heavy"]
+
+
+def test_batch_gets_its_share_while_interactive_is_queued():
+    scheduler = blocked_scheduler(batch_share=0.5)
+    batch, interactive = Tenant("batch", priority=BATCH), Tenant("interactive")
+
+    threads, order = queue_calls(scheduler, [batch] * 4 + [interactive] * 4)
+    for thread in threads:
+        thread.join()
+
+    assert order == ["interactive", "interactive", "batch", "interactive",
+                     "interactive", "batch", "batch", "batch"]
+
+
+def test_promoted_calls_compete_as_interactive():
+    scheduler = blocked_scheduler(batch_share=0.0)
+    background, user = Tenant("background", priority=BATCH), Tenant("user")
+
+    threads, order = queue_calls(scheduler, [background] * 2 + [user] * 2)
+    scheduler.promote(background)
+
+    assert scheduler.queue_depth()["batch"] == 0
+    for thread in threads:
+        thread.join()
+    assert order == ["background", "user", "background", "user"]
+
+
+def test_timed_out_call_leaves_the_queue():
+    scheduler = FairScheduler(calls=1, period=60)
+    scheduler.acquire()
+
+    with use_tenant(Tenant("late-session")):
+        with pytest.raises(QueueTimeoutError) as excinfo:
+            scheduler.acquire(timeout=0.05)
+
+    assert excinfo.value.session_id == "late-session"
+    assert scheduler.queue_depth() == {"interactive": 0, "batch": 0, "sessions": 0}
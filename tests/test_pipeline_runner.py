@@ -0,0 +1,69 @@
+from checkpoint_store import CheckpointStore
+from fakes import FakeEstimator, FakePipeline, FakePlanner
+from pipeline_runner import AnalysisRunner, STAGES
+from revision import DocumentDiff
+
+
+def make_runner(tmp_path):
+    pipeline, estimator = FakePipeline(), FakeEstimator()
+    runner = AnalysisRunner(pipeline, FakePlanner(), estimator, store=CheckpointStore(str(tmp_path)))
+    return runner, pipeline, estimator
+
+
+def test_requirements_only_run_needs_no_cost_params(tmp_path):
+    runner, pipeline, _ = make_runner(tmp_path)
+
+    outputs = runner.run("rfp text", None, run_id="doc", stages=["requirements"])
+
+    assert outputs == {"requirements": "requirements of rfp text"}
+    assert pipeline.calls == ["requirements"]
+
+
+def test_full_run_reuses_checkpointed_stages(tmp_path):
+    runner, pipeline, _ = make_runner(tmp_path)
+    runner.run("rfp text", None, run_id="doc", stages=["requirements"])
+
+    outputs = runner.run("rfp text", {"risk_factor": 1.2}, run_id="doc")
+
+    assert list(outputs) == STAGES
+    assert pipeline.calls == ["requirements", "tech_specs", "architecture"]
+
+
+def test_team_capacity_does_not_invalidate_cost_stage(tmp_path):
+    runner, _, estimator = make_runner(tmp_path)
+    runner.run("rfp text", {"risk_factor": 1.2, "team_capacity": {"Developer": 1}}, run_id="doc")
+    runner.run("rfp text", {"risk_factor": 1.2, "team_capacity": {"Developer": 3}}, run_id="doc")
+    assert estimator.calls == 1
+
+    runner.run("rfp text", {"risk_factor": 1.5, "team_capacity": {"Developer": 3}}, run_id="doc")
+    assert estimator.calls == 2
+
+
+PREVIOUS = {
+    "requirements": "- [UPDATED] Export invoices\n- Track orders",
+    "tech_specs": "- **[UPDATED]** REST API",
+    "architecture": "- Monolith",
+    "project_plan": "Plan",
+}
+
+
+def test_unchanged_revision_drops_earlier_markers(tmp_path):
+    runner, pipeline, _ = make_runner(tmp_path)
+    diff = DocumentDiff("Same text.", "Same text.")
+
+    outputs = runner.run_revision("Same text.", {}, PREVIOUS, diff, run_id="v3")
+
+    assert outputs["requirements"] == "- Export invoices\n- Track orders"
+    assert outputs["tech_specs"] == "- REST API"
+    assert not any(isinstance(call, tuple) for call in pipeline.calls)
+
+
+def test_revision_prompts_with_unmarked_previous_sections(tmp_path):
+    runner, pipeline, _ = make_runner(tmp_path)
+    diff = DocumentDiff("Track orders. Export invoices.", "Track orders. Export invoices. Send reminders.")
+
+    runner.run_revision("Track orders. Export invoices. Send reminders.", {}, PREVIOUS, diff, run_id="v3")
+
+    revised = {call[1]: call[2] for call in pipeline.calls if isinstance(call, tuple)}
+    assert revised["requirements"] == "- Export invoices\n- Track orders"
+    assert "[UPDATED]" not in "".join(revised.values())
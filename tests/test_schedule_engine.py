@@ -0,0 +1,62 @@
+import pytest
+
+from schedule_engine import ScheduleError, build_schedule
+
+PHASES = [
+    {"name": "Build", "estimated_hours": 16, "role_distribution": {"Developer": 1}},
+    {"name": "Test", "estimated_hours": 8, "role_distribution": {"Developer": 1}, "dependencies": ["Build"]},
+    {"name": "Docs", "estimated_hours": 8, "role_distribution": {"Developer": 1}},
+]
+
+
+def phase(schedule, name):
+    return next(summary for summary in schedule["phases"] if summary["name"] == name)
+
+
+def test_critical_path_and_slack():
+    schedule = build_schedule(PHASES)
+
+    assert schedule["duration_days"] == 3
+    assert schedule["critical_path"] == ["Build (Developer)", "Test (Developer)"]
+    test, docs = phase(schedule, "Test"), phase(schedule, "Docs")
+    assert (test["earliest_start"], test["earliest_finish"], test["slack"]) == (2, 3, 0)
+    assert test["critical"]
+    assert (docs["earliest_start"], docs["latest_finish"], docs["slack"]) == (0, 3, 2)
+    assert not docs["critical"]
+
+
+def test_levelling_serialises_work_beyond_role_capacity():
+    assert build_schedule(PHASES, {"developer": 1})["leveled_duration_days"] == 4
+    assert build_schedule(PHASES, {"Developer": 2})["leveled_duration_days"] == 3
+
+
+def test_dependency_cycle_is_reported():
+    phases = [
+        {"name": "Design", "estimated_hours": 8, "dependencies": ["Review"]},
+        {"name": "Review", "estimated_hours": 8, "dependencies": ["Design"]},
+    ]
+
+    with pytest.raises(ScheduleError, match="Dependency cycle"):
+        build_schedule(phases)
+
+
+def test_task_depending_on_its_own_phase_is_ignored():
+    phases = [
+        {"name": "Build", "tasks": [
+            {"name": "API", "estimated_hours": 8, "dependencies": ["Build"]},
+            {"name": "UI", "estimated_hours": 8, "dependencies": ["API"]},
+        ]},
+    ]
+
+    schedule = build_schedule(phases)
+
+    assert schedule["duration_days"] == 2
+    assert schedule["warnings"] == ["'API' in 'Build' depends on its own phase, ignored"]
+
+
+def test_duplicate_phase_is_ignored():
+    schedule = build_schedule(PHASES + [{"name": "Build", "estimated_hours": 80}])
+
+    assert [summary["name"] for summary in schedule["phases"]] == ["Build", "Test", "Docs"]
+    assert schedule["duration_days"] == 3
+    assert schedule["warnings"] == ["Duplicate phase 'Build' ignored; only the first one is scheduled"]
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight, WaitTimeoutError, detach_on
+
+
+class BlockingCall:
+    """A func for SingleFlight.do that runs until released or cancelled."""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.was_cancelled = threading.Event()
+
+    def __call__(self, cancelled):
+        self.calls += 1
+        self.started.set()
+        while not self.release.wait(0.01):
+            if cancelled.is_set():
+                self.was_cancelled.set()
+                return None
+        return f"result {self.calls}"
+
+
+def test_concurrent_callers_share_one_call():
+    flight, func = SingleFlight("test"), BlockingCall()
+    joined = []
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(flight.do, "key", func)
+        assert func.started.wait(5)
+        second = pool.submit(flight.do, "key", func, on_join=joined.append)
+        while not joined:
+            time.sleep(0.01)
+        func.release.set()
+
+        assert first.result(5) == second.result(5) == "result 1"
+    assert func.calls == 1
+
+
+def test_work_is_cancelled_when_the_last_waiter_times_out():
+    flight, func = SingleFlight("test"), BlockingCall()
+
+    with pytest.raises(WaitTimeoutError):
+        flight.do("key", func, timeout=0.05)
+
+    assert func.was_cancelled.wait(5)
+    func.release.set()
+    assert flight.do("key", func, timeout=5) == "result 2"
+
+
+def test_work_continues_while_another_caller_waits():
+    flight, func = SingleFlight("test"), BlockingCall()
+    joined = threading.Event()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        patient = pool.submit(flight.do, "key", func, timeout=5)
+        assert func.started.wait(5)
+        with pytest.raises(WaitTimeoutError):
+            flight.do("key", func, timeout=0.05, on_join=lambda context: joined.set())
+        assert joined.is_set()
+        func.release.set()
+
+        assert patient.result(5) == "result 1"
+    assert not func.was_cancelled.is_set()
+
+
+def test_detached_caller_stops_waiting():
+    flight, func = SingleFlight("test"), BlockingCall()
+    detach = threading.Event()
+    threading.Thread(target=lambda: func.started.wait(5) and detach.set()).start()
+
+    with detach_on(detach), pytest.raises(CancelledError):
+        flight.do("key", func)
+
+    assert func.was_cancelled.wait(5)
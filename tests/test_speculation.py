@@ -0,0 +1,48 @@
+import pytest
+
+from ai_analysis import StageFailedError
+from checkpoint_store import CheckpointStore
+from document_processor import DocumentProcessor
+from fakes import FakeEstimator, FakePipeline, FakePlanner
+from pipeline_runner import AnalysisRunner
+from speculation import SpeculativeAnalysis
+
+FILES = [("rfp.txt", b"The portal shall let customers track orders.")]
+
+
+def test_speculative_requirements_are_reused_by_the_real_run(tmp_path):
+    store = CheckpointStore(str(tmp_path))
+    pipeline = FakePipeline()
+    speculation = SpeculativeAnalysis("doc-hash", FILES, DocumentProcessor(), AnalysisRunner(pipeline, None, None, store))
+    content = speculation.result(timeout=10)
+
+    assert content == "The portal shall let customers track orders."
+    assert pipeline.calls == ["requirements"]
+
+    runner = AnalysisRunner(pipeline, FakePlanner(), FakeEstimator(), store)
+    completed = []
+    outputs = runner.run(content, {}, run_id="doc-hash",
+                         on_stage_complete=lambda stage, output, seconds, cached: completed.append((stage, cached)))
+
+    assert outputs["requirements"] == f"requirements of {content}"
+    assert completed[0] == ("requirements", True)
+    assert pipeline.calls.count("requirements") == 1
+
+
+def test_stage_failure_still_returns_the_extracted_text(tmp_path):
+    pipeline = FakePipeline(error=StageFailedError("requirements", RuntimeError("provider down")))
+    runner = AnalysisRunner(pipeline, None, None, CheckpointStore(str(tmp_path)))
+
+    speculation = SpeculativeAnalysis("doc-hash", FILES, DocumentProcessor(), runner)
+
+    assert speculation.result(timeout=10) == "The portal shall let customers track orders."
+
+
+def test_programming_errors_are_not_swallowed(tmp_path):
+    pipeline = FakePipeline(error=AttributeError("'NoneType' object has no attribute 'items'"))
+    runner = AnalysisRunner(pipeline, None, None, CheckpointStore(str(tmp_path)))
+
+    speculation = SpeculativeAnalysis("doc-hash", FILES, DocumentProcessor(), runner)
+
+    with pytest.raises(AttributeError):
+        speculation.result(timeout=10)
@@ -1,27 +1,13 @@
+import random
 import time
 from typing import List, Any, Callable, TypeVar
 from loguru import logger
 from functools import wraps
+from resilience import is_retryable, get_retry_after, retry_budget
+from metrics import metrics
 
 T = TypeVar('T')
 
-def rate_limit(calls: int, period: float):
-    """Rate limiting decorator that allows 'calls' number of calls per 'period' seconds."""
-    min_interval = period / calls
-    last_called = [0.0]  # Using list to allow modification in closure
-
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            elapsed = time.time() - last_called[0]
-            if elapsed < min_interval:
-                time.sleep(min_interval - elapsed)
-            result = func(*args, **kwargs)
-            last_called[0] = time.time()
-            return result
-        return wrapper
-    return decorator
-
 def batch_process(items: List[Any], batch_size: int, process_func: Callable[[List[Any]], List[T]]) -> List[T]:
     """Process items in batches to avoid overwhelming the API."""
     results = []
@@ -40,22 +26,53 @@ def retry_with_exponential_backoff(
     max_retries: int = 3,
     initial_delay: float = 1.0,
     max_delay: float = 60.0,
-    exponential_base: float = 2.0
+    exponential_base: float = 2.0,
+    circuit_breaker=None,
+    deadline_arg=None
 ):
-    """Retry decorator with exponential backoff."""
+    """Retry decorator with full-jitter exponential backoff.
+
+    Only transient errors (timeouts, connection errors, 429 and 5xx) are
+    retried; a server Retry-After hint takes precedence over the jittered
+    delay. Retries draw from the process-wide retry budget, and an optional
+    circuit breaker fails calls fast while the provider is down. deadline_arg
+    names a keyword argument holding a time.monotonic() deadline; a retry
+    that could not start before it is not attempted.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
+            retry_budget.record_call()
             for retry in range(max_retries):
+                if circuit_breaker is not None:
+                    circuit_breaker.before_call()
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
+                    if circuit_breaker is not None:
+                        circuit_breaker.record_failure(e)
+                    if not is_retryable(e):
+                        raise
                     if retry == max_retries - 1:
                         logger.error(f"Max retries ({max_retries}) reached. Last error: {str(e)}")
                         raise
-                    logger.warning(f"Attempt {retry + 1} failed: {str(e)}. Retrying...")
+                    if not retry_budget.try_acquire():
+                        metrics.increment("retry.budget_exhausted")
+                        logger.error(f"Retry budget exhausted. Last error: {str(e)}")
+                        raise
+                    delay = random.uniform(0, min(max_delay, initial_delay * exponential_base ** retry))
+                    retry_after = get_retry_after(e)
+                    if retry_after is not None:
+                        delay = min(max(delay, retry_after), max_delay)
+                    if deadline_arg is not None and time.monotonic() + delay >= kwargs[deadline_arg]:
+                        logger.error(f"No time left before the deadline to retry. Last error: {str(e)}")
+                        raise
+                    metrics.increment("retry.attempts")
+                    logger.warning(f"Attempt {retry + 1} failed: {str(e)}. Retrying in {delay:.1f}s...")
                     time.sleep(delay)
-                    delay = min(delay * exponential_base, max_delay)
+                else:
+                    if circuit_breaker is not None:
+                        circuit_breaker.record_success()
+                    return result
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator